@@ -25,5 +25,11 @@ echo "Collecting static files..."
 mkdir -p /app/staticfiles
 python manage.py collectstatic --noinput
 
+if [ -n "${PROMETHEUS_MULTIPROC_DIR:-}" ]; then
+  # Metrics from a previous container run would be summed into the new ones
+  rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+  mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+fi
+
 echo "Starting application..."
 exec "$@"
@@ -36,6 +36,8 @@ if allowed_hosts_raw:
     ALLOWED_HOSTS = [h.strip() for h in allowed_hosts_raw.split(',') if h.strip()]
 else:
     ALLOWED_HOSTS = ['localhost', '127.0.0.1']
+# Container hostnames used on the internal network (Prometheus scrapes web:8000)
+ALLOWED_HOSTS += [h.strip() for h in os.getenv('DJANGO_INTERNAL_HOSTS', 'web').split(',') if h.strip()]
 
 csrf_trusted_origins_raw = os.getenv('DJANGO_CSRF_TRUSTED_ORIGINS', '')
 CSRF_TRUSTED_ORIGINS = [o.strip() for o in csrf_trusted_origins_raw.split(',') if o.strip()]
@@ -61,6 +63,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracking.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -103,9 +106,25 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST', 'localhost'),
         'PORT': os.getenv('DATABASE_PORT', '5432'),
+        # Keep connections open between requests instead of reconnecting (and
+        # re-running PostGIS setup) every time; 0 restores per-request connects
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Ping a reused connection before the first query of a request so a
+        # connection dropped by the server/pooler is replaced transparently
+        'CONN_HEALTH_CHECKS': getenv_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+        },
     }
 }
 
+# DB_POOL_MODE=pgbouncer when DATABASE_HOST is a pgbouncer in transaction
+# pooling mode: named (server-side) cursors cannot span pooled transactions,
+# so QuerySet.iterator() falls back to client-side cursors
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', '').lower()
+if DB_POOL_MODE == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -152,12 +171,14 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Tell Django that HTTPS is handled by a proxy (Azure)
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
-# Redirect all HTTP → HTTPS
-SECURE_SSL_REDIRECT = True
+# Redirect all HTTP → HTTPS (set False to run over plain http locally, e.g. benchmarks)
+SECURE_SSL_REDIRECT = getenv_bool('SECURE_SSL_REDIRECT', True)
+# Prometheus scrapes the container over plain http
+SECURE_REDIRECT_EXEMPT = [r'^metrics$']
 
 # Secure cookies
-SESSION_COOKIE_SECURE = True
-CSRF_COOKIE_SECURE = True
+SESSION_COOKIE_SECURE = getenv_bool('SECURE_COOKIES', True)
+CSRF_COOKIE_SECURE = getenv_bool('SECURE_COOKIES', True)
 
 # Optional: HSTS (turn on once you know everything works)
 # SECURE_HSTS_SECONDS = 3600
@@ -173,10 +194,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # TomTom Routing API key (set TOMTOM_API_KEY in env)
 TOMTOM_API_KEY = os.getenv('TOMTOM_API_KEY', '')
+# Point at a local stub (manage.py fleet_stubs) for benchmarks
+TOMTOM_BASE_URL = os.getenv('TOMTOM_BASE_URL', 'https://api.tomtom.com')
+
+# Live ETA (/api/lorry/<id>/eta/): re-route through TomTom only when the lorry
+# is this far off its stored route, or the route is this old (keeps traffic
+# timings fresh); otherwise ETA is projected locally along the stored path
+ETA_REROUTE_DEVIATION_METERS = float(os.getenv('ETA_REROUTE_DEVIATION_METERS', '250'))
+ETA_ROUTE_MAX_AGE_SECONDS = int(os.getenv('ETA_ROUTE_MAX_AGE_SECONDS', '300'))
+# At most one re-route attempt per stored route in this window (shared by all
+# workers through LorryRoute.last_reroute_attempt_at), so a TomTom outage or
+# rate limit isn't hit on every 10 s live-track tick
+ETA_REROUTE_RETRY_SECONDS = int(os.getenv('ETA_REROUTE_RETRY_SECONDS', '60'))
 
 # Overpass API endpoint for POIs
 OVERPASS_URL = os.getenv('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
 
+# Gaps between consecutive fixes longer than this are treated as parked/offline
+# when computing time on road and km driven for the report rollups
+ROLLUP_MAX_GAP_SECONDS = int(os.getenv('ROLLUP_MAX_GAP_SECONDS', '300'))
+
+# Write-behind ingest: acknowledge fixes immediately and flush them to the DB in
+# multi-row INSERTs from a background thread instead of one commit per request
+INGEST_WRITE_BEHIND = getenv_bool('INGEST_WRITE_BEHIND', False)
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv('INGEST_FLUSH_INTERVAL_MS', '500'))
+INGEST_FLUSH_BATCH_SIZE = int(os.getenv('INGEST_FLUSH_BATCH_SIZE', '500'))
+INGEST_MAX_PENDING = int(os.getenv('INGEST_MAX_PENDING', '10000'))
+
+# Per-request instrumentation (tracking.metrics.MetricsMiddleware). Prometheus
+# scrapes /metrics on the web container directly; nginx does not expose it.
+# Server-Timing shows DB/upstream time in browser devtools; X-Query-Count is
+# read by manage.py bench_api.
+SERVER_TIMING_HEADER = getenv_bool('SERVER_TIMING_HEADER', False)
+QUERY_COUNT_HEADER = getenv_bool('QUERY_COUNT_HEADER', False)
+# docker-compose publishes port 8000, so /metrics only answers clients whose
+# address is in METRICS_ALLOWED_IPS (addresses or CIDR ranges) or that send
+# "Authorization: Bearer <METRICS_TOKEN>"; everyone else gets 403.
+METRICS_ALLOWED_IPS = [
+    n.strip() for n in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if n.strip()
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # Auth redirects
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
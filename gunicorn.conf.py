@@ -0,0 +1,70 @@
+# Gunicorn settings for the web container, all overridable with env vars.
+# Loaded by the Dockerfile CMD (`gunicorn --config gunicorn.conf.py ...`).
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    # Blank values (e.g. `${VAR:-}` in compose) fall back to the default
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    return value.lower() in ['1', 'true', 'yes', 'on'] if value else default
+
+
+def _cpu_count():
+    # CPUs this container may run on (respects cpusets), not the host total
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Requests mix fast DB reads/writes with slow upstream calls (TomTom up to
+# 10 s, Overpass up to 30 s). Threaded workers let those waits overlap without
+# extra dependencies: 2*CPU+1 processes keep the CPU busy and each process
+# serves GUNICORN_THREADS requests at once. Every thread may hold its own DB
+# connection (CONN_MAX_AGE), so workers*threads must stay below the database's
+# max_connections; the worker cap keeps that true on small managed Postgres tiers.
+workers = _env_int('GUNICORN_WORKERS', min(2 * _cpu_count() + 1, _env_int('GUNICORN_MAX_WORKERS', 9)))
+# gthread or sync only. gevent/eventlet would need psycopg2 made cooperative
+# (psycogreen) and monkey-patching before Django is imported, which
+# preload_app prevents; without both every DB call blocks the whole worker.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = _env_int('GUNICORN_THREADS', 4)
+
+# Longer than the slowest upstream call (Overpass 30 s), so it is never the
+# worker that gets killed mid-request
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# nginx keeps upstream connections short; a few seconds is enough to reuse them
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers now and then so slow leaks can't build up; the jitter stops
+# every worker restarting at the same moment
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# Import Django once in the master and fork workers from it: faster boots and
+# shared memory pages. DB connections and the write-behind flusher are opened
+# lazily inside each worker, so nothing unsafe crosses the fork.
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+# Heartbeat files on tmpfs; a disk-backed /tmp in Docker can stall workers
+worker_tmp_dir = os.getenv('GUNICORN_WORKER_TMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live-gauge files from the shared Prometheus directory
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.gis.admin import OSMGeoAdmin
-from .models import Lorry, Location, LorryRoute
+from .models import Lorry, Location, LorryRoute, LorryRollup
 
 @admin.register(Lorry)
 class LorryAdmin(admin.ModelAdmin):
@@ -17,4 +17,10 @@ class LocationAdmin(OSMGeoAdmin):
 @admin.register(LorryRoute)
 class LorryRouteAdmin(admin.ModelAdmin):
     list_display = ('lorry', 'created_at')
-    list_filter = ('lorry',)
\ No newline at end of file
+    list_filter = ('lorry',)
+
+
+@admin.register(LorryRollup)
+class LorryRollupAdmin(admin.ModelAdmin):
+    list_display = ('lorry', 'period', 'bucket_start', 'county', 'fix_count', 'distance_meters', 'seconds_on_road')
+    list_filter = ('period', 'lorry', 'county')
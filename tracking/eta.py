@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Point
+from django.db.models import Q
+from django.utils import timezone
+
+from .geo import project_onto_path
+from .metrics import record_cache, time_upstream
+from .models import LorryRoute
+
+
+class RoutingError(Exception):
+    """Upstream routing failed; `payload`/`status` are what the API returns to the client."""
+
+    def __init__(self, payload, status):
+        super().__init__(payload.get('detail'))
+        self.payload = payload
+        self.status = status
+
+
+def fetch_tomtom_route(origin, dest):
+    # Calls TomTom calculateRoute for "lat,lon" origin/dest strings and returns its JSON
+    if not settings.TOMTOM_API_KEY:
+        raise RoutingError({'detail': 'TomTom API key not configured'}, 500)
+
+    url = f"{settings.TOMTOM_BASE_URL}/routing/1/calculateRoute/{origin}:{dest}/json"
+    params = {
+        'key': settings.TOMTOM_API_KEY,
+        'routeRepresentation': 'polyline',
+        'computeTravelTimeFor': 'all',
+        'traffic': 'true'
+    }
+
+    try:
+        with time_upstream('tomtom'):
+            resp = requests.get(url, params=params, timeout=10)
+    except requests.RequestException as exc:
+        raise RoutingError({'detail': f'Failed to reach TomTom: {exc}'}, 502)
+
+    if resp.status_code != 200:
+        raise RoutingError({'detail': 'TomTom error', 'status': resp.status_code, 'body': resp.text}, 502)
+
+    try:
+        return resp.json()
+    except ValueError:
+        # A 200 that isn't JSON, e.g. a proxy error page
+        raise RoutingError({'detail': 'Unexpected TomTom response'}, 502)
+
+
+def reroute(lorry, lat, lon, destination):
+    # Fetches a fresh route from (lat, lon) to the destination point and stores it
+    data = fetch_tomtom_route(f'{lat:.5f},{lon:.5f}', f'{destination.y:.5f},{destination.x:.5f}')
+    try:
+        routes = data.get('routes') or []
+        legs = routes[0].get('legs') if routes else None
+        points = [(p['longitude'], p['latitude']) for leg in legs or [] for p in leg.get('points', [])]
+        if len(points) < 2:
+            raise RoutingError({'detail': 'No route returned'}, 502)
+        summary = routes[0].get('summary') or {}
+        travel_time = summary.get('travelTimeInSeconds')
+        distance = summary.get('lengthInMeters')
+        path = LineString(points, srid=4326)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise RoutingError({'detail': 'Unexpected TomTom response'}, 502)
+    return LorryRoute.objects.create(
+        lorry=lorry,
+        path=path,
+        destination=Point(destination.x, destination.y, srid=4326),
+        travel_time_seconds=travel_time,
+        distance_meters=distance,
+    )
+
+
+def claim_reroute_attempt(route, now):
+    # True for the one caller (across all workers) allowed to re-route this route now
+    retry_after = now - timedelta(seconds=settings.ETA_REROUTE_RETRY_SECONDS)
+    claimed = (LorryRoute.objects
+               .filter(pk=route.pk)
+               .filter(Q(last_reroute_attempt_at__isnull=True) | Q(last_reroute_attempt_at__lt=retry_after))
+               .update(last_reroute_attempt_at=now))
+    return claimed == 1
+
+
+def estimate_eta(lorry, route, lat, lon, allow_reroute=True):
+    """
+    Remaining distance/time for a lorry at (lat, lon) on its stored route.
+
+    The position is projected onto the route path and the route's travel time
+    is scaled by the fraction of distance left. TomTom is only called again
+    (and a new LorryRoute stored) when the lorry is more than
+    ETA_REROUTE_DEVIATION_METERS off the path or the route is older than
+    ETA_ROUTE_MAX_AGE_SECONDS, so traffic-aware timings stay reasonably fresh
+    without an upstream call every tick. Re-route attempts are limited to one
+    per route every ETA_REROUTE_RETRY_SECONDS across all workers (claimed on
+    the LorryRoute row), and a failed attempt falls back to the local
+    projection with `reroute_error` set.
+    """
+    now = timezone.now()
+    along, total, deviation = project_onto_path(route.path.coords, lat, lon)
+    age = (now - route.created_at).total_seconds()
+    off_route = deviation > settings.ETA_REROUTE_DEVIATION_METERS
+    stale = age > settings.ETA_ROUTE_MAX_AGE_SECONDS
+
+    rerouted = False
+    reroute_error = None
+    if (off_route or stale) and allow_reroute and claim_reroute_attempt(route, now):
+        try:
+            route = reroute(lorry, lat, lon, route.destination)
+        except RoutingError as exc:
+            reroute_error = exc.payload.get('detail')
+        else:
+            along, total, deviation = project_onto_path(route.path.coords, lat, lon)
+            age = 0.0
+            rerouted = True
+    record_cache('eta_route', hit=not rerouted)
+
+    remaining_fraction = (total - along) / total if total else 0.0
+    # The route's own distance/time figures come from TomTom; fall back to the geometry
+    route_distance = route.distance_meters if route.distance_meters is not None else total
+    remaining_distance = route_distance * remaining_fraction
+    remaining_time = None
+    if route.travel_time_seconds is not None:
+        remaining_time = route.travel_time_seconds * remaining_fraction
+
+    return {
+        'lorry': lorry.id,
+        'route_id': route.id,
+        'rerouted': rerouted,
+        'reroute_error': reroute_error,
+        'off_route': deviation > settings.ETA_REROUTE_DEVIATION_METERS,
+        'deviation_meters': round(deviation, 1),
+        'progress': round(along / total, 4) if total else 1.0,
+        'remaining_distance_meters': round(remaining_distance),
+        'remaining_time_seconds': round(remaining_time) if remaining_time is not None else None,
+        'eta': now + timedelta(seconds=remaining_time) if remaining_time is not None else None,
+        'route_age_seconds': round(age),
+        'route': route if rerouted else None,
+    }
@@ -0,0 +1,51 @@
+from math import asin, cos, radians, sin, sqrt
+
+EARTH_RADIUS_METERS = 6371000
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    # Great-circle distance between two lat/lon points
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * asin(sqrt(a))
+
+
+def project_onto_path(coords, lat, lon):
+    """
+    Map-match a point to the nearest segment of a path.
+
+    `coords` are (lon, lat) pairs as stored on LorryRoute.path. Segments are
+    compared in a local equirectangular projection centred on the point,
+    which is accurate to well under a metre over the few km that matter for
+    picking the nearest segment; distances along the path use haversine.
+    Returns (distance_along_m, total_length_m, deviation_m).
+    """
+    scale_y = radians(1) * EARTH_RADIUS_METERS
+    scale_x = scale_y * cos(radians(lat))
+
+    def to_xy(c):
+        return (c[0] - lon) * scale_x, (c[1] - lat) * scale_y
+
+    best_along, best_deviation = 0.0, float('inf')
+    travelled = 0.0
+    prev = coords[0]
+    ax, ay = to_xy(prev)
+    for c in coords[1:]:
+        bx, by = to_xy(c)
+        seg_len = haversine_meters(prev[1], prev[0], c[1], c[0])
+        dx, dy = bx - ax, by - ay
+        span = dx * dx + dy * dy
+        # Fraction along A->B of the foot of the perpendicular from the point (origin)
+        t = 0.0 if span == 0 else min(1.0, max(0.0, -(ax * dx + ay * dy) / span))
+        px, py = ax + t * dx, ay + t * dy
+        deviation = sqrt(px * px + py * py)
+        if deviation < best_deviation:
+            best_deviation = deviation
+            best_along = travelled + t * seg_len
+        travelled += seg_len
+        prev, ax, ay = c, bx, by
+
+    if len(coords) == 1:
+        best_deviation = sqrt(ax * ax + ay * ay)
+    return best_along, travelled, best_deviation
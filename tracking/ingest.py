@@ -0,0 +1,163 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+from .models import Location
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    In-process queue of validated Location rows flushed in bulk by a daemon thread.
+
+    A flush happens as soon as `batch_size` rows are pending, otherwise every
+    `flush_interval` seconds, so a row waits at most about one interval. If
+    `max_pending` rows are already waiting the row is refused at once
+    (enqueue returns False) and the flusher is woken, so a stalled database
+    pushes back on requests instead of growing memory without bound, and no
+    request thread ever pays for draining the queue. A row the database rejects (e.g. its lorry was deleted
+    after validation) is logged and dropped without holding up the rest.
+    Pending rows are flushed on interpreter exit.
+    """
+
+    def __init__(self, flush_interval, batch_size, max_pending):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def enqueue(self, location):
+        # Queues an unsaved Location; returns False (nothing queued) when full
+        self._ensure_thread()
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+                return False
+            self._pending.append(location)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        # Writes every pending row with multi-row INSERTs; returns rows written
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return written
+                try:
+                    written += self._write(batch)
+                except Exception:
+                    # Database unavailable: put the batch back in order so
+                    # nothing acknowledged is lost, and retry later
+                    with self._cond:
+                        self._pending.extendleft(reversed(batch))
+                    raise
+
+    def _write(self, batch):
+        # Inserts a batch; on a constraint error falls back to row-by-row and drops the offenders
+        try:
+            self._insert(batch)
+            return len(batch)
+        except IntegrityError:
+            pass
+        written = 0
+        for location in batch:
+            try:
+                self._insert([location])
+                written += 1
+            except IntegrityError:
+                logger.exception('Dropping queued location for lorry %s at %s', location.lorry_id, location.timestamp)
+        return written
+
+    def _insert(self, rows):
+        # Checks FK constraints now rather than at the outer commit so failures land on this batch
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            Location.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def close(self):
+        # Stops the flusher thread and writes whatever is still queued; never raises
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self._pending:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Write-behind shutdown flush failed; %d queued locations lost', len(self._pending))
+
+    def _ensure_thread(self):
+        # Starts the flusher lazily, and again in each forked gunicorn worker
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                # Rows inherited from the parent process belong to the parent
+                self._pending.clear()
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ingest-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # Flusher loop: waits for a full batch or the flush interval, then writes
+        try:
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.flush_interval
+                    while not self._stopping and len(self._pending) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 and self._pending:
+                            break
+                        if remaining <= 0:
+                            deadline = time.monotonic() + self.flush_interval
+                            remaining = self.flush_interval
+                        self._cond.wait(remaining)
+                    stopping = self._stopping
+                close_old_connections()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Write-behind flush failed; retrying in %.1fs', self.flush_interval)
+                    time.sleep(self.flush_interval)
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind_buffer():
+    # Returns the process-wide buffer, creating it on first use
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    flush_interval=settings.INGEST_FLUSH_INTERVAL_MS / 1000,
+                    batch_size=settings.INGEST_FLUSH_BATCH_SIZE,
+                    max_pending=settings.INGEST_MAX_PENDING,
+                )
+                atexit.register(_buffer.close)
+    return _buffer
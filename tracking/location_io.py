@@ -0,0 +1,368 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Location, Lorry
+
+FORMATS = ('csv', 'geojsonseq', 'parquet')
+PARQUET_BATCH_ROWS = 50000
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.geojsonseq': 'geojsonseq',
+    '.geojsonl': 'geojsonseq',
+    '.geojsons': 'geojsonseq',
+    '.jsonl': 'geojsonseq',
+    '.ndjson': 'geojsonseq',
+    '.parquet': 'parquet',
+}
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def guess_format(path):
+    # Picks a format from the file extension (stdin/stdout default to CSV)
+    for ext, fmt in _EXTENSIONS.items():
+        if str(path).lower().endswith(ext):
+            return fmt
+    return 'csv'
+
+
+def _require_pyarrow():
+    # Parquet support is optional; pyarrow is not in requirements.txt
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError('Parquet needs pyarrow: pip install pyarrow') from exc
+    return pyarrow
+
+
+# --- Import -----------------------------------------------------------------
+
+def read_csv(fh):
+    # Yields dict rows from a CSV file with a header line
+    yield from csv.DictReader(fh)
+
+
+def read_geojsonseq(fh):
+    # Yields flat dict rows from newline-delimited GeoJSON Point features (RFC 8142)
+    for line in fh:
+        line = line.strip().lstrip('\x1e')
+        if not line:
+            continue
+        try:
+            feature = json.loads(line)
+        except json.JSONDecodeError:
+            yield {'_error': 'invalid JSON'}
+            continue
+        if not isinstance(feature, dict):
+            yield {'_error': 'feature must be a JSON object'}
+            continue
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        if not isinstance(geometry, dict) or not isinstance(properties, dict):
+            yield {'_error': 'geometry and properties must be JSON objects'}
+            continue
+        coordinates = geometry.get('coordinates') or []
+        if not isinstance(coordinates, list):
+            yield {'_error': 'coordinates must be a list'}
+            continue
+        coords = coordinates + [None, None]
+        row = dict(properties)
+        row['lon'], row['lat'] = coords[0], coords[1]
+        yield row
+
+
+def read_parquet(path):
+    # Yields dict rows from a Parquet file one record batch at a time
+    pyarrow = _require_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+        yield from batch.to_pylist()
+
+
+def normalise_row(row, lorry_ids):
+    # Validates one input row and returns the values for the COPY staging table
+    if '_error' in row:
+        raise InvalidRow(row['_error'])
+
+    lorry_id = row.get('lorry_id') or row.get('lorry')
+    if lorry_id is None or lorry_id == '':
+        raise InvalidRow('lorry_id is required')
+    # Parquet/JSON may hand over floats; int() would silently truncate 3.9 to 3
+    if isinstance(lorry_id, float) and lorry_id.is_integer():
+        lorry_id = int(lorry_id)
+    if isinstance(lorry_id, bool) or not isinstance(lorry_id, (int, str)):
+        raise InvalidRow('lorry_id must be a whole number')
+    try:
+        lorry_id = int(lorry_id)
+    except ValueError:
+        raise InvalidRow('lorry_id must be a whole number')
+    if lorry_id not in lorry_ids:
+        raise InvalidRow(f'unknown lorry {lorry_id}')
+
+    try:
+        lat = float(row.get('lat', row.get('latitude')))
+        lon = float(row.get('lon', row.get('longitude')))
+    except (TypeError, ValueError):
+        raise InvalidRow('lat and lon must be numeric')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise InvalidRow('lat/lon out of range')
+
+    timestamp = row.get('timestamp')
+    if not isinstance(timestamp, datetime):
+        try:
+            timestamp = parse_datetime(str(timestamp or ''))
+        except ValueError:
+            timestamp = None
+    if timestamp is None:
+        raise InvalidRow('timestamp must be ISO 8601')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+
+    client_id = row.get('client_id') or None
+    if client_id is not None:
+        try:
+            client_id = str(uuid.UUID(str(client_id)))
+        except ValueError:
+            raise InvalidRow('client_id must be a UUID')
+
+    county = row.get('current_county') or row.get('county') or ''
+    if not isinstance(county, str):
+        raise InvalidRow('current_county must be text')
+    return [lorry_id, f'SRID=4326;POINT({lon!r} {lat!r})', timestamp.isoformat(), county[:100], client_id]
+
+
+class _CopyStream:
+    """File-like wrapper turning an iterator of CSV lines into COPY input without buffering it all."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def import_rows(rows, strict=False, progress=None, progress_every=100000):
+    """
+    Stream validated rows into tracking_location through COPY.
+
+    Rows are COPY'd into a temporary staging table and moved across with a
+    single INSERT ... SELECT. Repeats of the same lorry, timestamp and point
+    within the file are collapsed (keeping one with a client id if any), and
+    fixes already stored, either under the same client id (ON CONFLICT) or
+    at the same lorry, timestamp and point, are skipped, so neither a file
+    with repeated rows nor re-importing a file duplicates fixes.
+    Memory use is constant in the input size. Returns (inserted,
+    skipped_duplicates, invalid).
+    """
+    lorry_ids = set(Lorry.objects.values_list('id', flat=True))
+    stats = {'read': 0, 'invalid': 0, 'error': None}
+
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for row in rows:
+            stats['read'] += 1
+            try:
+                writer.writerow(normalise_row(row, lorry_ids))
+            except InvalidRow as exc:
+                if strict:
+                    stats['error'] = f'row {stats["read"]}: {exc}'
+                    raise
+                stats['invalid'] += 1
+            if progress and stats['read'] % progress_every == 0:
+                progress(stats['read'], stats['invalid'])
+            if out.tell():
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE location_import ('
+            ' lorry_id bigint NOT NULL,'
+            ' point geometry(Point, 4326) NOT NULL,'
+            ' timestamp timestamptz NOT NULL,'
+            ' current_county varchar(100),'
+            ' client_id uuid'
+            ') ON COMMIT DROP'
+        )
+        try:
+            cursor.cursor.copy_expert(
+                'COPY location_import (lorry_id, point, timestamp, current_county, client_id) '
+                'FROM STDIN WITH (FORMAT csv)',
+                _CopyStream(lines()),
+            )
+        except Exception:
+            # psycopg2 wraps errors raised while reading the stream; surface the row
+            if stats['error']:
+                raise InvalidRow(stats['error']) from None
+            raise
+        cursor.execute(
+            'INSERT INTO tracking_location (lorry_id, point, timestamp, current_county, client_id) '
+            'SELECT i.lorry_id, i.point, i.timestamp, i.current_county, i.client_id FROM ('
+            ' SELECT DISTINCT ON (lorry_id, timestamp, ST_X(point), ST_Y(point)) *'
+            ' FROM location_import'
+            ' ORDER BY lorry_id, timestamp, ST_X(point), ST_Y(point), client_id NULLS LAST'
+            ') i '
+            'WHERE NOT EXISTS ('
+            ' SELECT 1 FROM tracking_location l'
+            ' WHERE l.lorry_id = i.lorry_id AND l.timestamp = i.timestamp AND ST_Equals(l.point, i.point)'
+            ') '
+            'ON CONFLICT DO NOTHING'
+        )
+        inserted = cursor.rowcount
+
+    if progress:
+        progress(stats['read'], stats['invalid'])
+    valid = stats['read'] - stats['invalid']
+    return inserted, valid - inserted, stats['invalid']
+
+
+# --- Export -----------------------------------------------------------------
+
+def _filtered_locations(lorry_id=None, since=None, until=None):
+    # Location queryset restricted by the export filters, oldest first
+    qs = Location.objects.all()
+    if lorry_id is not None:
+        qs = qs.filter(lorry_id=lorry_id)
+    if since is not None:
+        qs = qs.filter(timestamp__gte=since)
+    if until is not None:
+        qs = qs.filter(timestamp__lt=until)
+    return qs.order_by('timestamp', 'id')
+
+
+class _CountingWriter:
+    """Write-through wrapper that counts lines COPY emits, for progress output."""
+
+    def __init__(self, fh, progress, progress_every):
+        self._fh = fh
+        self._progress = progress
+        self._progress_every = progress_every
+        self.lines = 0
+        self._next_report = progress_every
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        self.lines += data.count('\n')
+        if self._progress and self.lines >= self._next_report:
+            self._progress(self.lines)
+            self._next_report += self._progress_every
+        return self._fh.write(data)
+
+
+def export_csv(fh, progress=None, progress_every=100000, **filters):
+    # Streams matching rows straight out of PostgreSQL with COPY ... TO STDOUT
+    where_sql, where_params = '', []
+    conditions = []
+    if filters.get('lorry_id') is not None:
+        conditions.append('lorry_id = %s')
+        where_params.append(filters['lorry_id'])
+    if filters.get('since') is not None:
+        conditions.append('timestamp >= %s')
+        where_params.append(filters['since'])
+    if filters.get('until') is not None:
+        conditions.append('timestamp < %s')
+        where_params.append(filters['until'])
+    if conditions:
+        where_sql = ' WHERE ' + ' AND '.join(conditions)
+
+    with connection.cursor() as cursor:
+        # COPY cannot take bind parameters, so inline them safely with mogrify
+        select_sql = cursor.cursor.mogrify(
+            'SELECT id, lorry_id, ST_Y(point) AS lat, ST_X(point) AS lon, timestamp, '
+            f'current_county, client_id FROM {Location._meta.db_table}{where_sql} '
+            'ORDER BY timestamp, id',
+            where_params,
+        ).decode()
+        writer = _CountingWriter(fh, progress, progress_every)
+        cursor.cursor.copy_expert(f'COPY ({select_sql}) TO STDOUT WITH (FORMAT csv, HEADER)', writer)
+    rows = max(writer.lines - 1, 0)
+    if progress:
+        progress(rows)
+    return rows
+
+
+def _iter_export_rows(chunk_size=5000, **filters):
+    # Iterates matching rows through a server-side cursor in chunks
+    qs = _filtered_locations(**filters).values_list('id', 'lorry_id', 'point', 'timestamp', 'current_county', 'client_id')
+    for pk, lorry_id, point, timestamp, county, client_id in qs.iterator(chunk_size=chunk_size):
+        yield {
+            'id': pk,
+            'lorry_id': lorry_id,
+            'lat': point.y,
+            'lon': point.x,
+            'timestamp': timestamp,
+            'current_county': county or '',
+            'client_id': str(client_id) if client_id else None,
+        }
+
+
+def export_geojsonseq(fh, progress=None, progress_every=100000, **filters):
+    # Writes one GeoJSON Point feature per line
+    rows = 0
+    for row in _iter_export_rows(**filters):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [row.pop('lon'), row.pop('lat')]},
+            'properties': {**row, 'timestamp': row['timestamp'].isoformat()},
+        }
+        fh.write(json.dumps(feature) + '\n')
+        rows += 1
+        if progress and rows % progress_every == 0:
+            progress(rows)
+    if progress:
+        progress(rows)
+    return rows
+
+
+def export_parquet(path, progress=None, progress_every=100000, **filters):
+    # Writes matching rows to Parquet in fixed-size record batches
+    pyarrow = _require_pyarrow()
+    schema = pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('lorry_id', pyarrow.int64()),
+        ('lat', pyarrow.float64()),
+        ('lon', pyarrow.float64()),
+        ('timestamp', pyarrow.timestamp('us', tz='UTC')),
+        ('current_county', pyarrow.string()),
+        ('client_id', pyarrow.string()),
+    ])
+    rows = 0
+    batch = []
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for row in _iter_export_rows(**filters):
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                rows += len(batch)
+                batch = []
+                if progress and rows % progress_every < PARQUET_BATCH_ROWS:
+                    progress(rows)
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    if progress:
+        progress(rows)
+    return rows
@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+# Endpoint name -> how to build one request. Each builder gets (rng, lorry_ids)
+# and returns (method, path, json_body or None).
+SCENARIOS = {
+    'ingest': lambda rng, ids: ('POST', '/api/ingest-location/', {
+        'lorry_id': rng.choice(ids),
+        'lat': rng.uniform(51.6, 55.2),
+        'lon': rng.uniform(-10.3, -6.0),
+        'current_county': 'Dublin',
+    }),
+    'latest': lambda rng, ids: ('GET', '/api/latest-locations/', None),
+    'route': lambda rng, ids: ('GET', '/api/route/?origin={:.5f},{:.5f}&dest={:.5f},{:.5f}'.format(
+        rng.uniform(51.6, 55.2), rng.uniform(-10.3, -6.0), rng.uniform(51.6, 55.2), rng.uniform(-10.3, -6.0)), None),
+    'saved_route': lambda rng, ids: ('GET', f'/api/lorry/{rng.choice(ids)}/route/', None),
+    'pois': lambda rng, ids: ('GET', f'/api/lorry/{rng.choice(ids)}/pois/', None),
+    'reports': lambda rng, ids: ('GET', '/api/reports/?group_by=lorry', None),
+}
+DEFAULT_SCENARIOS = ['ingest', 'latest', 'saved_route', 'route', 'pois', 'reports']
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def login(base_url, username, password):
+    # Returns a requests session logged in through the normal Django login form
+    session = requests.Session()
+    login_url = urljoin(base_url, '/accounts/login/')
+    session.get(login_url, timeout=10).raise_for_status()
+    resp = session.post(login_url, data={
+        'username': username,
+        'password': password,
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+    }, headers={'Referer': login_url}, timeout=10, allow_redirects=False)
+    if resp.status_code != 302 or 'sessionid' not in session.cookies:
+        raise CommandError(f'Login as {username} failed (status {resp.status_code}). '
+                           'Running over http? Set SECURE_SSL_REDIRECT=False SECURE_COOKIES=False.')
+    return session
+
+
+class Command(BaseCommand):
+    help = ('Drive load against a running server and report throughput, p50/p99 latency and SQL '
+            'queries per endpoint. Start the server with QUERY_COUNT_HEADER=True to get query counts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', default='BenchAdmin')
+        parser.add_argument('--password', required=True, help='Password given to seed_fleet.')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help=f'Endpoint to load; repeatable. Default: {", ".join(DEFAULT_SCENARIOS)}.')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per endpoint.')
+        parser.add_argument('--warmup', type=float, default=2, help='Seconds of unrecorded requests first.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+        parser.add_argument('--compare', help='Baseline JSON from a previous --json run.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed regression vs --compare (0.2 = 20%% worse p99/throughput, any extra queries).')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        sessions = [login(base_url, options['username'], options['password']) for _ in range(options['concurrency'])]
+
+        resp = sessions[0].get(urljoin(base_url, '/api/lorries/'), timeout=10)
+        resp.raise_for_status()
+        lorry_ids = [row['id'] for row in resp.json()]
+        if not lorry_ids:
+            raise CommandError('No lorries found; run manage.py seed_fleet first.')
+
+        results = {}
+        for name in options['scenario'] or DEFAULT_SCENARIOS:
+            if options['warmup']:
+                self._run(name, sessions, base_url, lorry_ids, options['warmup'], options['seed'])
+            results[name] = self._run(name, sessions, base_url, lorry_ids, options['duration'], options['seed'])
+            self._print_row(name, results[name])
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+        if options['compare']:
+            self._compare(results, options['compare'], options['tolerance'])
+
+    def _run(self, name, sessions, base_url, lorry_ids, duration, seed):
+        # Hammers one endpoint from every session until the deadline
+        build = SCENARIOS[name]
+        latencies, queries = [], []
+        errors = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(index, session):
+            nonlocal errors
+            rng = random.Random(f'{seed}-{name}-{index}')
+            while time.perf_counter() < deadline:
+                method, path, body = build(rng, lorry_ids)
+                started = time.perf_counter()
+                try:
+                    resp = session.request(method, urljoin(base_url, path), json=body, timeout=60, headers={
+                        'X-CSRFToken': session.cookies.get('csrftoken', ''),
+                    })
+                    ok = resp.status_code < 400
+                except requests.RequestException:
+                    resp, ok = None, False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if not ok:
+                        errors += 1
+                        continue
+                    latencies.append(elapsed)
+                    if 'X-Query-Count' in resp.headers:
+                        queries.append(int(resp.headers['X-Query-Count']))
+
+        threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sessions)]
+        wall = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - wall
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': len(latencies) / wall if wall else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'avg_queries': sum(queries) / len(queries) if queries else None,
+        }
+
+    def _print_row(self, name, r):
+        queries = f'{r["avg_queries"]:.1f}' if r['avg_queries'] is not None else 'n/a'
+        self.stdout.write(
+            f'{name:<12} {r["requests"]:>7} req {r["errors"]:>5} err {r["rps"]:>8.1f} req/s '
+            f'p50 {r["p50_ms"]:>7.1f} ms  p99 {r["p99_ms"]:>7.1f} ms  queries {queries}'
+        )
+
+    def _compare(self, results, baseline_path, tolerance):
+        # Fails the command if any endpoint regressed beyond the tolerance
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)
+        problems = []
+        for name, current in results.items():
+            base = baseline.get(name)
+            if not base:
+                continue
+            if base['p99_ms'] and current['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+                problems.append(f'{name}: p99 {current["p99_ms"]:.1f} ms vs {base["p99_ms"]:.1f} ms')
+            if base['rps'] and current['rps'] < base['rps'] * (1 - tolerance):
+                problems.append(f'{name}: {current["rps"]:.1f} req/s vs {base["rps"]:.1f} req/s')
+            if base.get('avg_queries') is not None and current.get('avg_queries') is not None \
+                    and current['avg_queries'] > base['avg_queries'] + 0.5:
+                problems.append(f'{name}: {current["avg_queries"]:.1f} queries vs {base["avg_queries"]:.1f}')
+        if problems:
+            raise CommandError('Performance regression:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}.'))
@@ -0,0 +1,61 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction
+
+from tracking.models import Location, Lorry
+
+from .bench_api import percentile
+
+
+def ingest_workload(lorry):
+    # Same queries as ingest_location, rolled back so the benchmark leaves no rows
+    with transaction.atomic():
+        Lorry.objects.get(pk=lorry.pk)
+        Location.objects.create(lorry=lorry, point=Point(-6.26, 53.35, srid=4326), current_county='Dublin')
+        transaction.set_rollback(True)
+
+
+def latest_workload(lorry):
+    # Same query as latest_lorry_locations
+    list(Location.objects.select_related('lorry').order_by('lorry', '-timestamp').distinct('lorry'))
+
+
+WORKLOADS = {'ingest_location': ingest_workload, 'latest_lorry_locations': latest_workload}
+
+
+class Command(BaseCommand):
+    help = ('Measure per-request latency of the ingest and live-map queries with a fresh DB '
+            'connection per request (CONN_MAX_AGE=0) versus a reused one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def _time(self, workload, lorry, iterations, reconnect):
+        # Returns sorted per-iteration latencies in milliseconds
+        samples = []
+        for _ in range(iterations):
+            if reconnect:
+                connection.close()
+            started = perf_counter()
+            workload(lorry)
+            samples.append((perf_counter() - started) * 1000)
+        return sorted(samples)
+
+    def handle(self, *args, **options):
+        lorry = Lorry.objects.first()
+        if lorry is None:
+            raise CommandError('No lorries found; run manage.py seed_fleet first.')
+        iterations = options['iterations']
+        self.stdout.write(f'{connection.settings_dict["HOST"]}:{connection.settings_dict["PORT"]}, '
+                          f'{iterations} iterations each (p50 / p99 ms)')
+        for name, workload in WORKLOADS.items():
+            workload(lorry)  # warm caches before timing
+            fresh = self._time(workload, lorry, iterations, reconnect=True)
+            reused = self._time(workload, lorry, iterations, reconnect=False)
+            self.stdout.write(
+                f'{name:<24} new connection {percentile(fresh, 0.5):7.2f} / {percentile(fresh, 0.99):7.2f}   '
+                f'reused {percentile(reused, 0.5):7.2f} / {percentile(reused, 0.99):7.2f}   '
+                f'saved {percentile(fresh, 0.5) - percentile(reused, 0.5):7.2f} ms per request'
+            )
@@ -0,0 +1,64 @@
+import sys
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tracking import location_io
+
+
+class Command(BaseCommand):
+    help = 'Stream location history to CSV (via PostgreSQL COPY), GeoJSON-seq or Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout (CSV or GeoJSON-seq).")
+        parser.add_argument('--format', choices=location_io.FORMATS, help='Defaults to a guess from the file extension.')
+        parser.add_argument('--lorry', type=int, help='Only export this lorry id.')
+        parser.add_argument('--since', help='First day to include (YYYY-MM-DD, UTC).')
+        parser.add_argument('--until', help='Last day to include (YYYY-MM-DD, UTC).')
+        parser.add_argument('--progress-every', type=int, default=100000, help='Report progress every N rows.')
+
+    def _day_start(self, raw, option, offset_days=0):
+        # Converts a YYYY-MM-DD option into an aware UTC midnight
+        if not raw:
+            return None
+        try:
+            day = parse_date(raw)
+        except ValueError:
+            # Well-formed but impossible dates such as 2025-02-30
+            day = None
+        if day is None:
+            raise CommandError(f'--{option} must be YYYY-MM-DD')
+        return timezone.make_aware(datetime.combine(day + timedelta(days=offset_days), time.min))
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or location_io.guess_format(path)
+        filters = {
+            'lorry_id': options['lorry'],
+            'since': self._day_start(options['since'], 'since'),
+            'until': self._day_start(options['until'], 'until', offset_days=1),
+        }
+
+        def progress(rows):
+            self.stderr.write(f'{rows:,} rows written')
+
+        kwargs = dict(progress=progress, progress_every=options['progress_every'], **filters)
+        try:
+            if fmt == 'parquet':
+                if path == '-':
+                    raise CommandError('Parquet cannot be written to stdout')
+                rows = location_io.export_parquet(path, **kwargs)
+            else:
+                writer = location_io.export_csv if fmt == 'csv' else location_io.export_geojsonseq
+                fh = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+                try:
+                    rows = writer(fh, **kwargs)
+                finally:
+                    if fh is not sys.stdout:
+                        fh.close()
+        except (RuntimeError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {rows:,} locations to {path}.'))
@@ -0,0 +1,89 @@
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+
+from tracking.geo import haversine_meters
+
+ROUTE_PATH = re.compile(r'^/routing/1/calculateRoute/(-?[\d.]+),(-?[\d.]+):(-?[\d.]+),(-?[\d.]+)/json')
+AROUND = re.compile(r'around:\d+,(-?[\d.]+),(-?[\d.]+)')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers TomTom routing and Overpass queries with canned, deterministic data."""
+
+    latency = 0.0
+    route_points = 100
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # TomTom calculateRoute: straight line between origin and destination
+        time.sleep(self.latency)
+        match = ROUTE_PATH.match(self.path)
+        if not match:
+            self._send_json({'detail': 'not found'}, status=404)
+            return
+        o_lat, o_lon, d_lat, d_lon = (float(v) for v in match.groups())
+        n = self.route_points
+        points = [
+            {'latitude': o_lat + (d_lat - o_lat) * i / (n - 1), 'longitude': o_lon + (d_lon - o_lon) * i / (n - 1)}
+            for i in range(n)
+        ]
+        length = int(haversine_meters(o_lat, o_lon, d_lat, d_lon))
+        summary = {'lengthInMeters': length, 'travelTimeInSeconds': int(length / 20)}
+        self._send_json({'routes': [{'summary': summary, 'legs': [{'summary': summary, 'points': points}]}]})
+
+    def do_POST(self):
+        # Overpass interpreter: one fuel station near each sampled route point
+        time.sleep(self.latency)
+        length = int(self.headers.get('Content-Length') or 0)
+        query = parse_qs(self.rfile.read(length).decode()).get('data', [''])[0]
+        rng = random.Random(query)
+        elements = []
+        for i, (lat, lon) in enumerate(sorted(set(AROUND.findall(query)))):
+            elements.append({
+                'type': 'node',
+                'id': 900000000 + i,
+                'lat': float(lat) + rng.uniform(-0.005, 0.005),
+                'lon': float(lon) + rng.uniform(-0.005, 0.005),
+                'tags': {'amenity': 'fuel', 'name': f'Stub Fuel {i}'},
+            })
+        self._send_json({'elements': elements})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Run local TomTom/Overpass stand-ins for benchmarks. Start the app with '
+            'TOMTOM_BASE_URL=http://127.0.0.1:<port> OVERPASS_URL=http://127.0.0.1:<port>/api/interpreter '
+            'and any non-empty TOMTOM_API_KEY.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency-ms', type=int, default=150, help='Simulated upstream latency per call.')
+        parser.add_argument('--route-points', type=int, default=100)
+
+    def handle(self, *args, **options):
+        StubHandler.latency = options['latency_ms'] / 1000
+        StubHandler.route_points = max(2, options['route_points'])
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StubHandler)
+        self.stdout.write(f'Upstream stubs listening on http://127.0.0.1:{options["port"]} '
+                          f'({options["latency_ms"]} ms latency). Ctrl-C to stop.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
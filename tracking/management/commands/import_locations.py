@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking import location_io
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load location history from CSV, GeoJSON-seq or Parquet using PostgreSQL COPY.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin (CSV or GeoJSON-seq).")
+        parser.add_argument('--format', choices=location_io.FORMATS, help='Defaults to a guess from the file extension.')
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row instead of skipping it.')
+        parser.add_argument('--progress-every', type=int, default=100000, help='Report progress every N rows.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or location_io.guess_format(path)
+
+        def progress(read, invalid):
+            self.stderr.write(f'{read:,} rows read, {invalid:,} invalid')
+
+        try:
+            if fmt == 'parquet':
+                if path == '-':
+                    raise CommandError('Parquet cannot be read from stdin')
+                result = location_io.import_rows(
+                    location_io.read_parquet(path),
+                    strict=options['strict'], progress=progress, progress_every=options['progress_every'],
+                )
+            else:
+                reader = location_io.read_csv if fmt == 'csv' else location_io.read_geojsonseq
+                fh = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+                try:
+                    result = location_io.import_rows(
+                        reader(fh),
+                        strict=options['strict'], progress=progress, progress_every=options['progress_every'],
+                    )
+                finally:
+                    if fh is not sys.stdin:
+                        fh.close()
+        except (location_io.InvalidRow, RuntimeError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        inserted, duplicates, invalid = result
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {inserted:,} locations ({duplicates:,} duplicates skipped, {invalid:,} invalid rows skipped).'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from tracking.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold newly ingested locations into the hourly/daily lorry rollup tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Drop all rollups and rebuild them from the full location history.',
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = refresh_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups for {rebuilt} lorr{"y" if rebuilt == 1 else "ies"}.'))
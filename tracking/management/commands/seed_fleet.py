@@ -0,0 +1,125 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tracking.geo import haversine_meters
+from tracking.models import Location, Lorry, LorryRoute
+
+COUNTIES = [
+    'Carlow', 'Cavan', 'Clare', 'Cork', 'Donegal', 'Dublin', 'Galway', 'Kerry', 'Kildare',
+    'Kilkenny', 'Laois', 'Leitrim', 'Limerick', 'Longford', 'Louth', 'Mayo', 'Meath',
+    'Monaghan', 'Offaly', 'Roscommon', 'Sligo', 'Tipperary', 'Waterford', 'Westmeath',
+    'Wexford', 'Wicklow',
+]
+# Rough bounding box of the island so synthetic fixes land on the map
+LAT_RANGE = (51.6, 55.2)
+LON_RANGE = (-10.3, -6.0)
+
+
+class Command(BaseCommand):
+    help = 'Seed a reproducible synthetic fleet (lorries, location history, routes) for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lorries', type=int, default=50)
+        parser.add_argument('--fixes-per-lorry', type=int, default=2000)
+        parser.add_argument('--interval-seconds', type=int, default=30, help='Time between consecutive fixes.')
+        parser.add_argument('--route-points', type=int, default=200, help='Points per seeded LorryRoute (0 for none).')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, so runs are comparable.')
+        parser.add_argument('--prefix', default='Bench', help='Name prefix for seeded lorries and users.')
+        parser.add_argument('--password', required=True,
+                            help='Password for the seeded users, including the staff <prefix>Admin account.')
+        parser.add_argument('--clear', action='store_true', help='Delete lorries and users seeded with this prefix first.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--force', action='store_true', help='Run even though DEBUG is off.')
+
+    def handle(self, *args, **options):
+        # Creates a staff account and can delete users, so keep it off real deployments
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('seed_fleet only runs with DEBUG on; pass --force to seed this database anyway.')
+        prefix = options['prefix'].strip()
+        if not prefix:
+            raise CommandError('--prefix must not be empty.')
+        if not options['password']:
+            raise CommandError('--password must not be empty.')
+
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+
+        if options['clear']:
+            # Only the names this command creates, never other accounts sharing the prefix
+            deleted, _ = Lorry.objects.filter(name__startswith=f'{prefix}Lorry').delete()
+            User.objects.filter(username__startswith=f'{prefix}Lorry').delete()
+            User.objects.filter(username=f'{prefix}Admin').delete()
+            self.stdout.write(f'Cleared {deleted} rows for prefix {prefix!r}.')
+
+        admin, created = User.objects.get_or_create(username=f'{prefix}Admin', defaults={'is_staff': True})
+        if created:
+            admin.set_password(options['password'])
+            admin.save()
+
+        now = timezone.now()
+        interval = timedelta(seconds=options['interval_seconds'])
+        fixes = options['fixes_per_lorry']
+        total = 0
+
+        for n in range(1, options['lorries'] + 1):
+            name = f'{prefix}Lorry{n:04d}'
+            with transaction.atomic():
+                user, created = User.objects.get_or_create(username=name)
+                if created:
+                    user.set_password(options['password'])
+                    user.save()
+                lorry, _ = Lorry.objects.get_or_create(name=name, defaults={'user': user})
+
+                lat = rng.uniform(*LAT_RANGE)
+                lon = rng.uniform(*LON_RANGE)
+                county = rng.choice(COUNTIES)
+                start = now - interval * fixes
+                batch = []
+                for i in range(fixes):
+                    # Random walk of ~50-500 m per fix, occasionally crossing a county line
+                    lat = min(max(lat + rng.uniform(-0.004, 0.004), LAT_RANGE[0]), LAT_RANGE[1])
+                    lon = min(max(lon + rng.uniform(-0.006, 0.006), LON_RANGE[0]), LON_RANGE[1])
+                    if rng.random() < 0.002:
+                        county = rng.choice(COUNTIES)
+                    batch.append(Location(
+                        lorry=lorry,
+                        point=Point(lon, lat, srid=4326),
+                        timestamp=start + interval * i,
+                        current_county=county,
+                    ))
+                    if len(batch) >= options['batch_size']:
+                        Location.objects.bulk_create(batch)
+                        total += len(batch)
+                        batch = []
+                if batch:
+                    Location.objects.bulk_create(batch)
+                    total += len(batch)
+
+                points = options['route_points']
+                if points >= 2:
+                    dest_lat = rng.uniform(*LAT_RANGE)
+                    dest_lon = rng.uniform(*LON_RANGE)
+                    path = LineString([
+                        (lon + (dest_lon - lon) * t / (points - 1), lat + (dest_lat - lat) * t / (points - 1))
+                        for t in range(points)
+                    ], srid=4326)
+                    distance = haversine_meters(lat, lon, dest_lat, dest_lon)
+                    LorryRoute.objects.create(
+                        lorry=lorry,
+                        path=path,
+                        destination=Point(dest_lon, dest_lat, srid=4326),
+                        distance_meters=int(distance),
+                        travel_time_seconds=int(distance / 20),  # ~72 km/h
+                    )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["lorries"]} lorries and {total:,} locations. '
+            f'Log in as {prefix}Admin with the given password to benchmark.'
+        ))
@@ -0,0 +1,142 @@
+import hmac
+import ipaddress
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'fleettracker_request_duration_seconds',
+    'Request latency by Django view',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'fleettracker_db_queries_per_request',
+    'SQL queries run per request',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+DB_TIME = Histogram(
+    'fleettracker_db_duration_seconds',
+    'Time spent executing SQL per request',
+    ['view'],
+)
+UPSTREAM_LATENCY = Histogram(
+    'fleettracker_upstream_duration_seconds',
+    'Latency of calls to upstream APIs (TomTom, Overpass)',
+    ['service', 'outcome'],
+)
+CACHE_REQUESTS = Counter(
+    'fleettracker_cache_requests_total',
+    'Cache lookups by cache name and result',
+    ['cache', 'result'],
+)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'upstream_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.upstream_seconds = 0.0
+
+
+_current_stats = ContextVar('fleettracker_request_stats', default=None)
+
+
+@contextmanager
+def time_upstream(service):
+    # Times an upstream API call; a raised exception is recorded as outcome="error"
+    outcome = 'error'
+    started = perf_counter()
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        elapsed = perf_counter() - started
+        UPSTREAM_LATENCY.labels(service, outcome).observe(elapsed)
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.upstream_seconds += elapsed
+
+
+def record_cache(cache, hit):
+    # Counts one cache lookup so hit rates can be graphed per cache
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def scrape_allowed(request):
+    # True for a matching METRICS_TOKEN bearer header or an allow-listed client address
+    token = settings.METRICS_TOKEN
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode()):
+        return True
+    try:
+        addr = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(addr in ipaddress.ip_network(net, strict=False) for net in settings.METRICS_ALLOWED_IPS)
+
+
+def render_metrics():
+    # Exposition text for all workers (multiprocess mode) or just this process
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """
+    Records per-view latency, SQL query count/time and upstream time for each request.
+
+    Optionally reports the same numbers on the response as a Server-Timing
+    header (SERVER_TIMING_HEADER) and the query count as X-Query-Count
+    (QUERY_COUNT_HEADER, read by manage.py bench_api).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+
+        def count_query(execute, sql, params, many, context):
+            started = perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats.queries += 1
+                stats.db_seconds += perf_counter() - started
+
+        started = perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        total = perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else '') or 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method, f'{response.status_code // 100}xx').observe(total)
+        DB_QUERIES.labels(view).observe(stats.queries)
+        DB_TIME.labels(view).observe(stats.db_seconds)
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+                f'upstream;dur={stats.upstream_seconds * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+        if settings.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = str(stats.queries)
+        return response
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0006_link_existing_lorry_users'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_xid', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LorryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('county', models.CharField(blank=True, default='', max_length=100)),
+                ('fix_count', models.IntegerField(default=0)),
+                ('distance_meters', models.FloatField(default=0)),
+                ('seconds_on_road', models.IntegerField(default=0)),
+                ('first_fix_at', models.DateTimeField()),
+                ('last_fix_at', models.DateTimeField()),
+                ('lorry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='tracking.lorry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='lorryrollup',
+            index=models.Index(fields=['period', 'bucket_start'], name='tracking_rollup_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lorryrollup',
+            constraint=models.UniqueConstraint(fields=('lorry', 'period', 'bucket_start', 'county'), name='unique_lorry_rollup_bucket'),
+        ),
+    ]
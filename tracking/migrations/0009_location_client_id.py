@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0008_alter_location_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='client_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('lorry', 'client_id'), name='unique_location_client_id'),
+        ),
+    ]
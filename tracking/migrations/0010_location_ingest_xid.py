@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0009_location_client_id'),
+    ]
+
+    operations = [
+        # Database-only column (not on the model) so every insert path — ORM,
+        # bulk_create and COPY imports — gets the inserting transaction's id
+        migrations.RunSQL(
+            sql=[
+                'ALTER TABLE tracking_location ADD COLUMN ingest_xid bigint NOT NULL DEFAULT txid_current()',
+                'CREATE INDEX tracking_location_ingest_xid_idx ON tracking_location (ingest_xid)',
+            ],
+            reverse_sql=[
+                'DROP INDEX IF EXISTS tracking_location_ingest_xid_idx',
+                'ALTER TABLE tracking_location DROP COLUMN ingest_xid',
+            ],
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0010_location_ingest_xid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['lorry', 'timestamp'], name='tracking_loc_lorry_ts_idx'),
+        ),
+    ]
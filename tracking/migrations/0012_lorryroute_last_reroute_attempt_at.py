@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0011_location_lorry_timestamp_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lorryroute',
+            name='last_reroute_attempt_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.gis.db import models as gis_models
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Lorry(models.Model):
@@ -16,8 +17,20 @@ class Lorry(models.Model):
 class Location(models.Model):
     lorry = models.ForeignKey(Lorry, on_delete=models.CASCADE, related_name='locations')
     point = gis_models.PointField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to now but can be set explicitly, e.g. when a buffered fix is
+    # written after it was acknowledged
+    timestamp = models.DateTimeField(default=timezone.now)
     current_county = models.CharField(max_length=100, blank=True, null=True)
+    # Client-generated id for fixes queued offline by the PWA; replays are ignored
+    client_id = models.UUIDField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lorry', 'client_id'], name='unique_location_client_id'),
+        ]
+        indexes = [
+            models.Index(fields=['lorry', 'timestamp'], name='tracking_loc_lorry_ts_idx'),
+        ]
 
     def __str__(self):
         #  location string for admin displays
@@ -31,6 +44,9 @@ class LorryRoute(models.Model):
     travel_time_seconds = models.IntegerField(null=True, blank=True)
     distance_meters = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last time live ETA tried to replace this route; claimed with a conditional
+    # UPDATE so all gunicorn workers share one re-route throttle
+    last_reroute_attempt_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         get_latest_by = 'created_at'
@@ -38,3 +54,42 @@ class LorryRoute(models.Model):
     def __str__(self):
         # Shows which lorry the route belongs to with timestamp
         return f"Route for {self.lorry.name} @ {self.created_at}"
+
+
+class LorryRollup(models.Model):
+    PERIOD_HOUR = 'hour'
+    PERIOD_DAY = 'day'
+    PERIOD_CHOICES = [(PERIOD_HOUR, 'Hourly'), (PERIOD_DAY, 'Daily')]
+
+    lorry = models.ForeignKey(Lorry, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    county = models.CharField(max_length=100, blank=True, default='')
+    fix_count = models.IntegerField(default=0)
+    distance_meters = models.FloatField(default=0)
+    seconds_on_road = models.IntegerField(default=0)
+    first_fix_at = models.DateTimeField()
+    last_fix_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lorry', 'period', 'bucket_start', 'county'], name='unique_lorry_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'bucket_start'], name='tracking_rollup_period_idx'),
+        ]
+
+    def __str__(self):
+        # Shows lorry, period and bucket for admin displays
+        return f"{self.get_period_display()} rollup for {self.lorry.name} @ {self.bucket_start}"
+
+
+class RollupCheckpoint(models.Model):
+    # Every Location written by a transaction id below last_xid is already
+    # folded into LorryRollup (see tracking.rollups; the ingest_xid column comes from migration 0010)
+    name = models.CharField(max_length=50, unique=True)
+    last_xid = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ xid {self.last_xid}"
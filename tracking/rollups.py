@@ -0,0 +1,178 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import LorryRollup, RollupCheckpoint
+
+CHECKPOINT_NAME = 'location_rollups'
+
+# Hourly buckets are rebuilt straight from tracking_location. Each fix is
+# paired with the previous fix of the same lorry (LAG) so distance and time on
+# road are attributed to the bucket/county of the later fix. Gaps longer than
+# ROLLUP_MAX_GAP_SECONDS count as parked/offline rather than driving.
+HOURLY_SQL = """
+WITH fixes AS (
+    SELECT
+        timestamp,
+        COALESCE(current_county, '') AS county,
+        point,
+        LAG(point) OVER w AS prev_point,
+        LAG(timestamp) OVER w AS prev_ts
+    FROM tracking_location
+    WHERE lorry_id = %(lorry_id)s AND timestamp >= %(lookback)s AND timestamp < %(until)s
+    WINDOW w AS (ORDER BY timestamp, id)
+)
+INSERT INTO tracking_lorryrollup
+    (lorry_id, period, bucket_start, county, fix_count, distance_meters,
+     seconds_on_road, first_fix_at, last_fix_at)
+SELECT
+    %(lorry_id)s,
+    'hour',
+    date_trunc('hour', timestamp),
+    county,
+    COUNT(*),
+    COALESCE(SUM(ST_Distance(prev_point::geography, point::geography))
+             FILTER (WHERE timestamp - prev_ts <= %(max_gap)s), 0),
+    COALESCE(SUM(EXTRACT(EPOCH FROM timestamp - prev_ts))
+             FILTER (WHERE timestamp - prev_ts <= %(max_gap)s), 0)::integer,
+    MIN(timestamp),
+    MAX(timestamp)
+FROM fixes
+WHERE timestamp >= %(since)s
+GROUP BY date_trunc('hour', timestamp), county
+"""
+
+# tracking_location.ingest_xid is the (epoch-extended) id of the transaction
+# that inserted the row. Every transaction below the snapshot xmin has finished,
+# so no row with a smaller ingest_xid can still appear. Unlike Location.id,
+# which is handed out at INSERT time and may commit much later (bulk imports,
+# write-behind flushes), this makes the xmin a safe checkpoint.
+WATERMARK_SQL = "SELECT txid_snapshot_xmin(txid_current_snapshot())"
+
+# Days to rebuild: every day that received new fixes, plus the day of the
+# first fix after the last new one on each day. That fix's LAG partner may now
+# be a new row, so its distance/time can change even if it is on a later day.
+# Further than max_gap away it counts as parked either way, so it is skipped.
+TOUCHED_SQL = """
+WITH new_fixes AS (
+    SELECT lorry_id, date_trunc('day', timestamp) AS day, MAX(timestamp) AS last_ts
+    FROM tracking_location
+    WHERE ingest_xid >= %(last_xid)s AND ingest_xid < %(upper)s
+    GROUP BY lorry_id, date_trunc('day', timestamp)
+)
+SELECT lorry_id, day FROM new_fixes
+UNION
+SELECT n.lorry_id, date_trunc('day', nxt.timestamp)
+FROM new_fixes n
+CROSS JOIN LATERAL (
+    SELECT l.timestamp
+    FROM tracking_location l
+    WHERE l.lorry_id = n.lorry_id AND l.timestamp > n.last_ts AND l.timestamp <= n.last_ts + %(max_gap)s
+    ORDER BY l.timestamp
+    LIMIT 1
+) nxt
+ORDER BY 1, 2
+"""
+
+# Daily buckets are folded from the hourly rows, never from raw fixes.
+DAILY_SQL = """
+INSERT INTO tracking_lorryrollup
+    (lorry_id, period, bucket_start, county, fix_count, distance_meters,
+     seconds_on_road, first_fix_at, last_fix_at)
+SELECT
+    lorry_id,
+    'day',
+    date_trunc('day', bucket_start),
+    county,
+    SUM(fix_count),
+    SUM(distance_meters),
+    SUM(seconds_on_road),
+    MIN(first_fix_at),
+    MAX(last_fix_at)
+FROM tracking_lorryrollup
+WHERE lorry_id = %(lorry_id)s AND period = 'hour'
+  AND bucket_start >= %(since)s AND bucket_start < %(until)s
+GROUP BY lorry_id, date_trunc('day', bucket_start), county
+"""
+
+
+def _start_of_day(ts):
+    # Truncates a datetime to midnight so whole daily buckets are rebuilt
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _day_ranges(days):
+    # Collapses sorted midnights into [start, end) runs of consecutive days
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return ranges
+
+
+def rebuild_lorry_rollups(lorry_id, since, until):
+    # Recomputes hourly and daily rollups for one lorry between two days
+    """Delete and rebuild a lorry's rollup buckets from the day of `since` up to `until` (exclusive)."""
+    since = _start_of_day(since)
+    max_gap = timedelta(seconds=settings.ROLLUP_MAX_GAP_SECONDS)
+    params = {
+        'lorry_id': lorry_id,
+        'since': since,
+        'until': until,
+        'lookback': since - max_gap,
+        'max_gap': max_gap,
+    }
+    LorryRollup.objects.filter(lorry_id=lorry_id, bucket_start__gte=since, bucket_start__lt=until).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(HOURLY_SQL, params)
+        cursor.execute(DAILY_SQL, params)
+
+
+def refresh_rollups(full=False):
+    # Folds locations ingested since the last checkpoint into the rollup tables
+    """
+    Incrementally refresh LorryRollup.
+
+    Only the days that received rows committed since the checkpoint are
+    rebuilt, plus the day of the next fix after them (see TOUCHED_SQL), so a
+    late offline fix or a backfilled day costs one or two days of work rather
+    than the rest of the lorry's history. Rows from transactions still open
+    when the refresh starts are picked up by a later run. Returns the number
+    of lorries rebuilt.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Taken before this transaction locks anything (and gets an xid itself)
+            cursor.execute(WATERMARK_SQL)
+            upper = cursor.fetchone()[0]
+
+        checkpoint, _ = (RollupCheckpoint.objects
+                         .select_for_update()
+                         .get_or_create(name=CHECKPOINT_NAME))
+        if full:
+            checkpoint.last_xid = 0
+            LorryRollup.objects.all().delete()
+
+        if upper <= checkpoint.last_xid:
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(TOUCHED_SQL, {
+                'last_xid': checkpoint.last_xid,
+                'upper': upper,
+                'max_gap': timedelta(seconds=settings.ROLLUP_MAX_GAP_SECONDS),
+            })
+            touched = cursor.fetchall()
+        days_by_lorry = {}
+        for lorry_id, day in touched:
+            days_by_lorry.setdefault(lorry_id, []).append(day)
+        for lorry_id, days in days_by_lorry.items():
+            for since, until in _day_ranges(days):
+                rebuild_lorry_rollups(lorry_id, since, until)
+
+        checkpoint.last_xid = upper
+        checkpoint.save(update_fields=['last_xid', 'updated_at'])
+    return len(days_by_lorry)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.gis.geos import Point, LineString
-from .models import Lorry, Location, LorryRoute
+from .models import Lorry, Location, LorryRoute, LorryRollup
 
 class LorrySerializer(serializers.ModelSerializer):
     class Meta:
@@ -35,6 +35,8 @@ class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = ['id', 'lorry', 'lorry_name', 'latitude', 'longitude', 'timestamp', 'current_county', 'travel_time_seconds', 'distance_meters']
+        # Server-assigned, as before Location.timestamp became editable for write-behind/batch ingest
+        read_only_fields = ['timestamp']
 
 
 class LorryRouteSerializer(serializers.ModelSerializer):
@@ -64,3 +66,11 @@ class LorryRouteSerializer(serializers.ModelSerializer):
         line = LineString([(lng, lat) for lat, lng in path_coords], srid=4326)
         dest_point = Point(dest_coords[1], dest_coords[0], srid=4326)
         return LorryRoute.objects.create(path=line, destination=dest_point, **validated_data)
+
+
+class LorryRollupSerializer(serializers.ModelSerializer):
+    lorry_name = serializers.CharField(source='lorry.name', read_only=True)
+
+    class Meta:
+        model = LorryRollup
+        fields = ['lorry', 'lorry_name', 'period', 'bucket_start', 'county', 'fix_count', 'distance_meters', 'seconds_on_road', 'first_fix_at', 'last_fix_at']
@@ -41,6 +41,13 @@
     let userMarker = null;
     let hasCenteredOnUser = false;
 
+    // Offline fix queue flushing (see fix-queue.js)
+    const FIX_FLUSH_MIN_BACKOFF = 5000;
+    const FIX_FLUSH_MAX_BACKOFF = 300000;
+    const FIX_FLUSH_ONLINE_JITTER = 5000;
+    let fixFlushTimer = null;
+    let fixFlushBackoff = 0;
+
     // Pulls latest lorry locations and refreshes markers/list
     function updateFleet() {
         const refreshBtn = document.getElementById('refresh-btn');
@@ -323,12 +330,33 @@
         }
     }
 
-    // Posts the current position to ingest endpoint
+    // Queues the current position and tries to send the queue straight away
     function postLiveLocation(lat, lon) {
         if (!liveUpdateConfig.ingestUrl || !liveUpdateConfig.lorryId) {
             return;
         }
+        if (!window.FixQueue || !window.indexedDB) {
+            postLiveLocationDirect(lat, lon);
+            return;
+        }
 
+        const fix = {
+            id: FixQueue.newFixId(),
+            lorry_id: liveUpdateConfig.lorryId,
+            lat: lat,
+            lon: lon,
+            timestamp: new Date().toISOString()
+        };
+        FixQueue.enqueue(fix, getCsrfToken())
+            .then(() => scheduleFixFlush(0))
+            .catch(err => {
+                console.warn('Failed to queue live location, posting directly:', err);
+                postLiveLocationDirect(lat, lon);
+            });
+    }
+
+    // Posts a single position without queueing (no IndexedDB available)
+    function postLiveLocationDirect(lat, lon) {
         fetch(liveUpdateConfig.ingestUrl, {
             method: 'POST',
             headers: {
@@ -345,6 +373,45 @@
         });
     }
 
+    // Flushes queued fixes after delayMs; failures back off exponentially so
+    // a long signal gap is retried slowly instead of on every new fix
+    function scheduleFixFlush(delayMs) {
+        if (fixFlushTimer) return;
+        fixFlushTimer = setTimeout(() => {
+            fixFlushTimer = null;
+            FixQueue.flush()
+                .then(() => {
+                    fixFlushBackoff = 0;
+                })
+                .catch(err => {
+                    console.warn('Queued fixes not sent yet:', err);
+                    fixFlushBackoff = Math.min(fixFlushBackoff ? fixFlushBackoff * 2 : FIX_FLUSH_MIN_BACKOFF, FIX_FLUSH_MAX_BACKOFF);
+                    requestFixSync();
+                    scheduleFixFlush(fixFlushBackoff);
+                });
+        }, delayMs);
+    }
+
+    // Asks the service worker to flush the queue when connectivity returns,
+    // even if this tab is closed (Background Sync, where supported)
+    function requestFixSync() {
+        if (!('serviceWorker' in navigator)) return;
+        navigator.serviceWorker.ready
+            .then(reg => reg.sync && reg.sync.register(FixQueue.SYNC_TAG))
+            .catch(() => {});
+    }
+
+    // On reconnect, flush after a random delay so a fleet regaining signal
+    // together doesn't hit the server at the same instant
+    function handleOnline() {
+        if (fixFlushTimer) {
+            clearTimeout(fixFlushTimer);
+            fixFlushTimer = null;
+        }
+        fixFlushBackoff = 0;
+        scheduleFixFlush(Math.random() * FIX_FLUSH_ONLINE_JITTER);
+    }
+
     // Binds click handlers to a lorry marker and list item
     function attachLorryClick(lorryId, lorryName, marker) {
         marker.off('click');
@@ -704,7 +771,8 @@
         );
     }
 
-    // Recalculates the route from the latest live position
+    // Refreshes ETA from the latest live position; the server only re-routes
+    // through TomTom when the lorry leaves the route or the route gets old
     async function updateRouteFromLatestLocation() {
         if (!latestLiveLocation || !liveTrackDestination) return;
 
@@ -716,23 +784,37 @@
             return;
         }
 
-        const originStr = `${latestLiveLocation.lat.toFixed(5)},${latestLiveLocation.lon.toFixed(5)}`;
-        const destStr = `${liveTrackDestination.lat.toFixed(5)},${liveTrackDestination.lon.toFixed(5)}`;
         try {
-            const resp = await fetch(`${routingConfig.endpoint}?origin=${originStr}&dest=${destStr}`);
+            // POST, because the server may store a fresh route
+            const resp = await fetch(`/api/lorry/${LIVE_TRACK_LORRY_ID}/eta/`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCsrfToken()
+                },
+                body: JSON.stringify({
+                    lat: Number(latestLiveLocation.lat.toFixed(5)),
+                    lon: Number(latestLiveLocation.lon.toFixed(5))
+                })
+            });
+            if (resp.status === 204) {
+                throw new Error('No stored route. Set a destination first.');
+            }
             if (!resp.ok) {
-                throw new Error(await resp.text() || 'Route request failed');
+                throw new Error(await resp.text() || 'ETA request failed');
             }
             const data = await resp.json();
-            const route = data.routes && data.routes[0];
-            if (!route || !route.legs || !route.legs[0] || !route.legs[0].points) {
-                throw new Error('No route returned');
+            if (data.route && data.route.path) {
+                drawRouteFromPoints(data.route.path);
+            } else if (!routeLine) {
+                await loadStoredRoute(LIVE_TRACK_LORRY_ID, LIVE_TRACK_LORRY_NAME);
+            }
+            setActiveRouteInfo(data.remaining_distance_meters, data.remaining_time_seconds, LIVE_TRACK_LORRY_NAME);
+            if (data.reroute_error) {
+                setRouteStatus(`Live ETA updated (route refresh failed: ${data.reroute_error}).`, 'info');
+            } else {
+                setRouteStatus(data.rerouted ? 'Live route updated.' : 'Live ETA updated.', 'info');
             }
-            const points = route.legs[0].points.map(p => [p.latitude, p.longitude]);
-            drawRouteFromPoints(points);
-            const summary = route.summary || {};
-            setActiveRouteInfo(summary.lengthInMeters, summary.travelTimeInSeconds, LIVE_TRACK_LORRY_NAME);
-            setRouteStatus('Live route updated.', 'info');
         } catch (err) {
             console.error('Live route error:', err);
             setRouteStatus(`Live route error: ${err.message}`, 'error');
@@ -867,6 +949,16 @@
     updateFleet();
     setInterval(updateFleet, 15000);
 
+    // Send anything left in the offline queue from a previous session
+    if (window.FixQueue && window.indexedDB) {
+        window.addEventListener('online', handleOnline);
+        FixQueue.count()
+            .then(pending => {
+                if (pending > 0) handleOnline();
+            })
+            .catch(err => console.warn('Fix queue unavailable:', err));
+    }
+
     // Expose functions for inline handlers
     window.updateFleet = updateFleet;
     window.toggleCounties = toggleCounties;
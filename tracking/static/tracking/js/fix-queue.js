@@ -0,0 +1,135 @@
+// IndexedDB-backed queue of live location fixes waiting to reach the server.
+// Loaded by the page (app.js) and by the service worker (Background Sync).
+(function (global) {
+    const DB_NAME = 'fleettracker';
+    const DB_VERSION = 1;
+    const FIX_STORE = 'pending-fixes';
+    const META_STORE = 'meta';
+    const BATCH_URL = '/api/ingest-location/batch/';
+    const BATCH_SIZE = 100;
+    const SYNC_TAG = 'flush-fixes';
+
+    let dbPromise = null;
+    let flushPromise = null;
+
+    // Opens (and on first use creates) the queue database
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const req = indexedDB.open(DB_NAME, DB_VERSION);
+                req.onupgradeneeded = () => {
+                    const db = req.result;
+                    const fixes = db.createObjectStore(FIX_STORE, { keyPath: 'id' });
+                    fixes.createIndex('timestamp', 'timestamp');
+                    db.createObjectStore(META_STORE);
+                };
+                req.onsuccess = () => resolve(req.result);
+                req.onerror = () => reject(req.error);
+            }).catch(err => {
+                dbPromise = null;
+                throw err;
+            });
+        }
+        return dbPromise;
+    }
+
+    // Runs fn against the given stores inside one transaction
+    async function withStores(storeNames, mode, fn) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(storeNames, mode);
+            let result;
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+            const stores = storeNames.map(name => tx.objectStore(name));
+            fn(...stores, value => { result = value; });
+        });
+    }
+
+    // Generates the client-side id that makes server ingest idempotent
+    function newFixId() {
+        if (global.crypto && global.crypto.randomUUID) {
+            return global.crypto.randomUUID();
+        }
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3) | 0x8).toString(16);
+        });
+    }
+
+    // Stores a fix (and the CSRF token the service worker will need to send it)
+    function enqueue(fix, csrfToken) {
+        return withStores([FIX_STORE, META_STORE], 'readwrite', (fixes, meta) => {
+            fixes.put(fix);
+            if (csrfToken) meta.put(csrfToken, 'csrftoken');
+        });
+    }
+
+    // Reads the oldest queued fixes plus the stored CSRF token
+    function peek(limit) {
+        return withStores([FIX_STORE, META_STORE], 'readonly', (fixes, meta, done) => {
+            const batch = [];
+            const out = { fixes: batch, csrfToken: '' };
+            meta.get('csrftoken').onsuccess = e => { out.csrfToken = e.target.result || ''; };
+            fixes.index('timestamp').openCursor().onsuccess = e => {
+                const cursor = e.target.result;
+                if (cursor && batch.length < limit) {
+                    batch.push(cursor.value);
+                    cursor.continue();
+                }
+            };
+            done(out);
+        });
+    }
+
+    // Drops fixes the server has accepted or permanently rejected
+    function remove(ids) {
+        return withStores([FIX_STORE], 'readwrite', fixes => {
+            ids.forEach(id => fixes.delete(id));
+        });
+    }
+
+    // Counts fixes still waiting to be sent
+    function count() {
+        return withStores([FIX_STORE], 'readonly', (fixes, done) => {
+            fixes.count().onsuccess = e => done(e.target.result);
+        });
+    }
+
+    // Sends queued fixes in batches until the queue is empty; rejects on network/server error
+    function flush() {
+        if (flushPromise) return flushPromise;
+        flushPromise = (async () => {
+            let sent = 0;
+            while (true) {
+                const { fixes, csrfToken } = await peek(BATCH_SIZE);
+                if (fixes.length === 0) return sent;
+                const resp = await fetch(BATCH_URL, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': csrfToken
+                    },
+                    body: JSON.stringify({ fixes })
+                });
+                if (!resp.ok) {
+                    throw new Error(`Fix batch failed with status ${resp.status}`);
+                }
+                const data = await resp.json();
+                const done = (data.accepted || []).concat((data.rejected || []).map(r => r.id));
+                if (done.length === 0) {
+                    throw new Error('Fix batch made no progress');
+                }
+                await remove(done);
+                sent += fixes.length;
+            }
+        })().finally(() => {
+            flushPromise = null;
+        });
+        return flushPromise;
+    }
+
+    global.FixQueue = { SYNC_TAG, newFixId, enqueue, flush, count };
+})(self);
@@ -1,8 +1,11 @@
-const CACHE_NAME = 'fleettracker-pwa-v2';
+importScripts('/static/tracking/js/fix-queue.js');
+
+const CACHE_NAME = 'fleettracker-pwa-v3';
 const ASSETS = [
   '/?v=2',
   '/static/tracking/css/app.css',
   '/static/tracking/js/app.js',
+  '/static/tracking/js/fix-queue.js',
   '/static/tracking/manifest.json',
   '/static/tracking/icons/lorry_192.png?v=2',
   '/static/tracking/icons/lorry_512.png?v=2'
@@ -63,3 +66,10 @@ self.addEventListener('fetch', (event) => {
     );
   }
 });
+
+self.addEventListener('sync', (event) => {
+  // Flushes fixes queued while offline; a rejection makes the browser retry later
+  if (event.tag === FixQueue.SYNC_TAG) {
+    event.waitUntil(FixQueue.flush());
+  }
+});
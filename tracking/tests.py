@@ -1,3 +1,432 @@
-from django.test import TestCase
+import io
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .eta import RoutingError, estimate_eta
+from .geo import project_onto_path
+from .ingest import WriteBehindBuffer
+from .location_io import import_rows, read_csv, read_geojsonseq
+from .models import Location, Lorry, LorryRollup, LorryRoute
+from .serializers import LocationSerializer
+from .rollups import refresh_rollups
+
+
+def fix(lorry, ts, lon, lat, county='Dublin'):
+    # Builds an unsaved Location at a fixed time/place
+    return Location(lorry=lorry, point=Point(lon, lat, srid=4326), timestamp=ts, current_county=county)
+
+
+# Rollups run against committed transactions only (the checkpoint is a
+# transaction-snapshot xmin), so these tests cannot live inside TestCase's
+# wrapping transaction.
+class RollupTests(TransactionTestCase):
+    def setUp(self):
+        self.lorry = Lorry.objects.create(name='RollupLorry')
+        self.start = datetime(2026, 1, 5, 9, 0, tzinfo=dt_timezone.utc)
+
+    def rollup(self, period):
+        return LorryRollup.objects.get(lorry=self.lorry, period=period)
+
+    def test_hourly_and_daily_totals(self):
+        # ~1.1 km north in 60 s, then a 2 h gap that must not count as driving
+        Location.objects.bulk_create([
+            fix(self.lorry, self.start, -6.26, 53.35),
+            fix(self.lorry, self.start + timedelta(seconds=60), -6.26, 53.36),
+            fix(self.lorry, self.start + timedelta(hours=2), -6.26, 53.50),
+        ])
+        self.assertEqual(refresh_rollups(), 1)
+
+        first_hour = LorryRollup.objects.get(lorry=self.lorry, period='hour', bucket_start=self.start)
+        self.assertEqual(first_hour.fix_count, 2)
+        self.assertEqual(first_hour.seconds_on_road, 60)
+        self.assertAlmostEqual(first_hour.distance_meters, 1113, delta=5)
+
+        day = self.rollup('day')
+        self.assertEqual(day.fix_count, 3)
+        self.assertEqual(day.seconds_on_road, 60)
+        self.assertEqual(day.bucket_start, self.start.replace(hour=0))
+
+    def test_refresh_without_new_rows_is_a_no_op(self):
+        Location.objects.create(lorry=self.lorry, point=Point(-6.26, 53.35, srid=4326), timestamp=self.start)
+        refresh_rollups()
+        self.assertEqual(refresh_rollups(), 0)
+
+    def test_late_fix_only_rebuilds_its_own_days(self):
+        later = self.start + timedelta(days=10)
+        Location.objects.bulk_create([
+            fix(self.lorry, self.start, -6.26, 53.35),
+            fix(self.lorry, later, -6.26, 53.35),
+        ])
+        refresh_rollups()
+        # Marker to see whether the later day is rebuilt
+        LorryRollup.objects.filter(lorry=self.lorry, bucket_start__gte=later.replace(hour=0)).update(fix_count=99)
+
+        Location.objects.create(lorry=self.lorry, point=Point(-6.26, 53.36, srid=4326),
+                                timestamp=self.start + timedelta(seconds=60))
+        self.assertEqual(refresh_rollups(), 1)
+
+        self.assertEqual(LorryRollup.objects.get(lorry=self.lorry, period='day', bucket_start=self.start.replace(hour=0)).fix_count, 2)
+        self.assertEqual(LorryRollup.objects.get(lorry=self.lorry, period='day', bucket_start=later.replace(hour=0)).fix_count, 99)
+
+    def test_next_fix_on_the_following_day_is_rebuilt(self):
+        midnight = self.start.replace(hour=0) + timedelta(days=1)
+        Location.objects.bulk_create([
+            fix(self.lorry, midnight - timedelta(minutes=10), -6.26, 53.35),
+            fix(self.lorry, midnight + timedelta(seconds=30), -6.26, 53.36),
+        ])
+        refresh_rollups()
+        next_day = LorryRollup.objects.get(lorry=self.lorry, period='day', bucket_start=midnight)
+        self.assertEqual(next_day.distance_meters, 0)
+
+        # Fills the gap just before midnight, so the 00:00:30 fix now pairs with it
+        Location.objects.create(lorry=self.lorry, point=Point(-6.26, 53.355, srid=4326),
+                                timestamp=midnight - timedelta(seconds=30))
+        refresh_rollups()
+        next_day.refresh_from_db()
+        self.assertAlmostEqual(next_day.distance_meters, 556, delta=5)
+
+    def test_row_committed_late_with_lower_id_is_rolled_up(self):
+        inserted = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            # Inserts first (lower id) but commits only after the refresh below
+            try:
+                with transaction.atomic():
+                    Location.objects.create(lorry=self.lorry, point=Point(-6.26, 53.35, srid=4326),
+                                            timestamp=self.start)
+                    inserted.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        self.assertTrue(inserted.wait(10))
+        late = Location.objects.create(lorry=self.lorry, point=Point(-6.26, 53.36, srid=4326),
+                                       timestamp=self.start + timedelta(seconds=60))
+
+        refresh_rollups()
+        release.set()
+        writer.join(10)
+        self.assertLess(Location.objects.exclude(pk=late.pk).get().pk, late.pk)
+
+        refresh_rollups()
+        self.assertEqual(self.rollup('day').fix_count, 2)
+
+
+class WriteBehindBufferTests(TestCase):
+    def setUp(self):
+        self.lorry = Lorry.objects.create(name='BufferLorry')
+        self.buffer = WriteBehindBuffer(flush_interval=60, batch_size=10, max_pending=2)
+        # Flush by hand; a flusher thread would use its own connection
+        patcher = mock.patch.object(self.buffer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def location(self, lorry=None):
+        return Location(lorry=lorry or self.lorry, point=Point(-6.26, 53.35, srid=4326), current_county='Dublin')
+
+    def test_flush_writes_pending_rows(self):
+        self.assertTrue(self.buffer.enqueue(self.location()))
+        self.assertTrue(self.buffer.enqueue(self.location()))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(Location.objects.filter(lorry=self.lorry).count(), 2)
+
+    def test_bad_row_is_dropped_without_blocking_the_queue(self):
+        gone = Lorry.objects.create(name='DeletedLorry')
+        orphan = self.location(gone)
+        gone.delete()
+        self.buffer._pending.extend([self.location(), orphan, self.location()])
+
+        with self.assertLogs('tracking.ingest', level='ERROR'):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len(self.buffer._pending), 0)
+        self.assertEqual(Location.objects.filter(lorry=self.lorry).count(), 2)
+
+    def test_enqueue_refuses_at_once_when_full(self):
+        self.assertTrue(self.buffer.enqueue(self.location()))
+        self.assertTrue(self.buffer.enqueue(self.location()))
+        # The request thread never drains the queue itself
+        with mock.patch.object(self.buffer, 'flush') as flush:
+            self.assertFalse(self.buffer.enqueue(self.location()))
+        flush.assert_not_called()
+        self.assertEqual(len(self.buffer._pending), 2)
+
+    def test_close_never_raises(self):
+        self.buffer.enqueue(self.location())
+        with mock.patch.object(Location.objects, 'bulk_create', side_effect=OperationalError('db down')), \
+                self.assertLogs('tracking.ingest', level='ERROR'):
+            self.buffer.close()
+
+
+class LocationSerializerTests(SimpleTestCase):
+    def test_timestamp_is_not_client_writable(self):
+        self.assertTrue(LocationSerializer().fields['timestamp'].read_only)
+
+
+class ProjectOntoPathTests(SimpleTestCase):
+    # (lon, lat): ~11.1 km north, then ~6.7 km west
+    path = [(-6.0, 53.0), (-6.0, 53.1), (-6.1, 53.1)]
+
+    def test_point_on_path(self):
+        along, total, deviation = project_onto_path(self.path, 53.1, -6.05)
+        self.assertAlmostEqual(total, 17796, delta=5)
+        self.assertAlmostEqual(along, 14458, delta=5)
+        self.assertAlmostEqual(deviation, 0, delta=0.5)
+
+    def test_point_beside_path_matches_nearest_segment(self):
+        along, _, deviation = project_onto_path(self.path, 53.05, -6.001)
+        self.assertAlmostEqual(along, 5560, delta=5)
+        self.assertAlmostEqual(deviation, 67, delta=1)
+
+    def test_point_past_the_end_clamps_to_destination(self):
+        along, total, deviation = project_onto_path(self.path, 53.2, -6.2)
+        self.assertAlmostEqual(along, total)
+        self.assertGreater(deviation, 10000)
+
+
+class EtaTests(TestCase):
+    def setUp(self):
+        self.lorry = Lorry.objects.create(name='EtaLorry')
+        self.route = LorryRoute.objects.create(
+            lorry=self.lorry,
+            path=LineString([(-6.0, 53.0), (-6.0, 53.1)], srid=4326),
+            destination=Point(-6.0, 53.1, srid=4326),
+            travel_time_seconds=600,
+            distance_meters=11000,
+        )
+        # Old enough that every call wants to re-route
+        LorryRoute.objects.filter(pk=self.route.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.route.refresh_from_db()
+
+    def test_projects_remaining_time_proportionally(self):
+        result = estimate_eta(self.lorry, self.route, 53.05, -6.0, allow_reroute=False)
+        self.assertFalse(result['rerouted'])
+        self.assertAlmostEqual(result['progress'], 0.5, delta=0.01)
+        self.assertAlmostEqual(result['remaining_time_seconds'], 300, delta=5)
+
+    def test_failed_reroute_falls_back_to_projection_and_is_throttled(self):
+        with mock.patch('tracking.eta.fetch_tomtom_route',
+                        side_effect=RoutingError({'detail': 'TomTom error'}, 502)) as fetch:
+            first = estimate_eta(self.lorry, self.route, 53.05, -6.0)
+            second = estimate_eta(self.lorry, self.route, 53.05, -6.0)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first['reroute_error'], 'TomTom error')
+        self.assertFalse(first['rerouted'])
+        self.assertAlmostEqual(first['remaining_time_seconds'], 300, delta=5)
+        self.assertIsNone(second['reroute_error'])
+        self.assertEqual(second['route_id'], self.route.id)
+
+    def test_reroute_is_retried_after_the_retry_window(self):
+        failing = mock.patch('tracking.eta.fetch_tomtom_route',
+                             side_effect=RoutingError({'detail': 'TomTom error'}, 502))
+        with failing as fetch:
+            estimate_eta(self.lorry, self.route, 53.05, -6.0)
+            # Another worker loading the same route must not retry straight away
+            estimate_eta(self.lorry, LorryRoute.objects.get(pk=self.route.pk), 53.05, -6.0)
+            self.assertEqual(fetch.call_count, 1)
+
+            LorryRoute.objects.filter(pk=self.route.pk).update(
+                last_reroute_attempt_at=timezone.now() - timedelta(minutes=5))
+            estimate_eta(self.lorry, self.route, 53.05, -6.0)
+            self.assertEqual(fetch.call_count, 2)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_get_never_reroutes_but_post_may(self):
+        owner = get_user_model().objects.create_user('EtaOwner')
+        Lorry.objects.filter(pk=self.lorry.pk).update(user=owner)
+        self.client.force_login(owner)
+        url = f'/api/lorry/{self.lorry.id}/eta/'
+        with mock.patch('tracking.eta.fetch_tomtom_route',
+                        side_effect=RoutingError({'detail': 'TomTom error'}, 502)) as fetch:
+            response = self.client.get(url, {'lat': 53.05, 'lon': -6.0})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(fetch.call_count, 0)
+
+            response = self.client.post(url, {'lat': 53.05, 'lon': -6.0}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(response.json()['reroute_error'], 'TomTom error')
+
+    @override_settings(TOMTOM_API_KEY='test-key')
+    def test_non_json_tomtom_reply_is_a_routing_error(self):
+        reply = mock.Mock(status_code=200, text='<html>Bad gateway</html>')
+        reply.json.side_effect = ValueError('Expecting value')
+        with mock.patch('tracking.eta.requests.get', return_value=reply):
+            result = estimate_eta(self.lorry, self.route, 53.05, -6.0)
+        self.assertEqual(result['reroute_error'], 'Unexpected TomTom response')
+        self.assertEqual(LorryRoute.objects.filter(lorry=self.lorry).count(), 1)
+
+    @override_settings(TOMTOM_API_KEY='test-key')
+    def test_malformed_route_summary_is_a_routing_error(self):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = {'routes': [{
+            'legs': [{'points': [{'latitude': 53.05, 'longitude': -6.0}, {'latitude': 53.1, 'longitude': -6.0}]}],
+            'summary': 'not an object',
+        }]}
+        with mock.patch('tracking.eta.requests.get', return_value=reply):
+            result = estimate_eta(self.lorry, self.route, 53.05, -6.0)
+        self.assertEqual(result['reroute_error'], 'Unexpected TomTom response')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, METRICS_TOKEN='scrape-secret')
+class MetricsViewTests(SimpleTestCase):
+    def test_loopback_may_scrape(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_internal_host_is_allowed(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_HOST='web:8000').status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_other_addresses_need_the_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9',
+                                         HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9',
+                                         HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+
+# import_rows commits its own transaction (the staging table is ON COMMIT DROP)
+class ImportLocationsTests(TransactionTestCase):
+    def setUp(self):
+        self.lorry = Lorry.objects.create(name='ImportLorry')
+
+    def csv_rows(self):
+        return read_csv(io.StringIO(
+            'lorry_id,lat,lon,timestamp,current_county,client_id\n'
+            f'{self.lorry.id},53.35,-6.26,2026-01-05T09:00:00Z,Dublin,\n'
+            f'{self.lorry.id},53.36,-6.26,2026-01-05T09:01:00Z,Dublin,3f1c8f7e-2a4b-4c1d-9e57-0d6a3b2c1a10\n'
+        ))
+
+    def test_reimport_skips_rows_with_and_without_client_id(self):
+        self.assertEqual(import_rows(self.csv_rows()), (2, 0, 0))
+        self.assertEqual(import_rows(self.csv_rows()), (0, 2, 0))
+        self.assertEqual(Location.objects.filter(lorry=self.lorry).count(), 2)
+
+    def test_repeated_rows_in_one_file_are_stored_once(self):
+        row = {'lorry_id': self.lorry.id, 'lat': 53.35, 'lon': -6.26, 'timestamp': '2026-01-05T09:00:00Z'}
+        self.assertEqual(import_rows([row, dict(row)]), (1, 1, 0))
+
+    def test_fractional_lorry_id_is_invalid(self):
+        row = {'lat': 53.35, 'lon': -6.26, 'timestamp': '2026-01-05T09:00:00Z'}
+        self.assertEqual(import_rows([{**row, 'lorry_id': self.lorry.id + 0.9},
+                                      {**row, 'lorry_id': float(self.lorry.id)}]), (1, 0, 1))
+
+    def test_malformed_rows_are_counted_as_invalid(self):
+        point = '{"geometry": {"type": "Point", "coordinates": [-6.26, 53.35]}, "properties": %s}'
+        lines = '\n'.join([
+            '[1, 2]',
+            '"just a string"',
+            '{"geometry": [-6.26, 53.35], "properties": {}}',
+            point % f'{{"lorry_id": {self.lorry.id}, "timestamp": "2026-01-05T09:00:00Z", "current_county": 7}}',
+            point % f'{{"lorry_id": {self.lorry.id}, "timestamp": "2026-01-05T09:00:00Z"}}',
+        ])
+        self.assertEqual(import_rows(read_geojsonseq(io.StringIO(lines))), (1, 0, 4))
+
+
+class ExportLocationsTests(SimpleTestCase):
+    def test_impossible_date_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, '--since must be YYYY-MM-DD'):
+            call_command('export_locations', '-', '--since', '2025-02-30', stdout=io.StringIO())
+
+
+class SeedFleetTests(TestCase):
+    def seed(self, *args):
+        call_command('seed_fleet', '--lorries', '1', '--fixes-per-lorry', '2', '--route-points', '0',
+                     *args, stdout=io.StringIO())
+
+    def test_refuses_without_debug_or_force(self):
+        with self.assertRaisesMessage(CommandError, 'DEBUG'):
+            self.seed('--password', 'pw')
+        self.assertFalse(Lorry.objects.exists())
+
+    def test_requires_password_and_prefix(self):
+        with self.assertRaises(CommandError):
+            self.seed('--force')
+        with self.assertRaisesMessage(CommandError, '--prefix'):
+            self.seed('--force', '--password', 'pw', '--prefix', '', '--clear')
+
+    def test_clear_only_removes_seeded_accounts(self):
+        User = get_user_model()
+        User.objects.create_user('Benchmarker', password='keep')
+        self.seed('--force', '--password', 'pw')
+        self.seed('--force', '--password', 'pw', '--clear')
+        self.assertTrue(User.objects.filter(username='Benchmarker').exists())
+        self.assertEqual(Lorry.objects.filter(name__startswith='BenchLorry').count(), 1)
+        self.assertTrue(User.objects.get(username='BenchAdmin').check_password('pw'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class IngestBatchTests(TestCase):
+    url = '/api/ingest-location/batch/'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('BatchDriver', password='pw')
+        self.lorry = Lorry.objects.create(name='BatchLorry', user=self.user)
+        self.client.force_login(self.user)
+
+    def fix(self, lorry=None, **overrides):
+        return {
+            'id': str(uuid.uuid4()),
+            'lorry_id': (lorry or self.lorry).id,
+            'lat': 53.35,
+            'lon': -6.26,
+            'timestamp': '2026-01-05T09:00:00Z',
+            'current_county': 'Dublin',
+            **overrides,
+        }
+
+    def post(self, *fixes):
+        response = self.client.post(self.url, {'fixes': list(fixes)}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_replayed_fix_is_accepted_and_stored_once(self):
+        fix = self.fix()
+        self.assertEqual(self.post(fix)['accepted'], [fix['id']])
+        self.assertEqual(self.post(fix)['accepted'], [fix['id']])
+        self.assertEqual(Location.objects.filter(lorry=self.lorry).count(), 1)
+
+    def test_future_timestamp_is_rejected(self):
+        fix = self.fix(timestamp=(timezone.now() + timedelta(hours=1)).isoformat())
+        body = self.post(fix)
+        self.assertEqual(body['rejected'], [{'id': fix['id'], 'detail': 'timestamp is in the future'}])
+        self.assertFalse(Location.objects.exists())
+
+    def test_other_users_lorry_is_rejected(self):
+        other = Lorry.objects.create(name='SomeoneElsesLorry',
+                                     user=get_user_model().objects.create_user('OtherDriver'))
+        mine, theirs = self.fix(), self.fix(lorry=other)
+        body = self.post(mine, theirs)
+        self.assertEqual(body['accepted'], [mine['id']])
+        self.assertEqual(body['rejected'], [{'id': theirs['id'], 'detail': 'Forbidden'}])
+        self.assertFalse(Location.objects.filter(lorry=other).exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FleetReportTests(TestCase):
+    url = '/api/reports/'
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('ReportUser'))
+
+    def test_impossible_date_is_a_bad_request(self):
+        response = self.client.get(self.url, {'since': '2025-02-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'since/until must be YYYY-MM-DD')
+
+    def test_since_after_until_is_a_bad_request(self):
+        response = self.client.get(self.url, {'since': '2025-03-02', 'until': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
@@ -10,10 +10,14 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/latest-locations/', views.latest_lorry_locations, name='latest_locations'),
     path('api/ingest-location/', views.ingest_location, name='ingest_location'),
+    path('api/ingest-location/batch/', views.ingest_location_batch, name='ingest_location_batch'),
     path('api/route/', views.calculate_route, name='tomtom_route'),
     path('api/lorry/<int:lorry_id>/route/', views.latest_route_for_lorry, name='latest_route_for_lorry'),
     path('api/lorry/<int:lorry_id>/route/clear/', views.clear_route, name='clear_route'),
+    path('api/lorry/<int:lorry_id>/eta/', views.lorry_eta, name='lorry_eta'),
     path('api/routes/', views.save_route, name='save_route'),
     path('api/lorry/<int:lorry_id>/pois/', views.pois_for_lorry, name='pois_for_lorry'),
+    path('api/reports/', views.fleet_report, name='fleet_report'),
+    path('metrics', views.metrics, name='metrics'),
     path('service-worker.js', views.service_worker, name='service_worker'),
 ]
@@ -3,15 +3,23 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS, BasePermission
 from django.conf import settings
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django.contrib.gis.geos import Point
-from django.db.models import Max
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 import requests
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 from math import ceil
-from .models import Lorry, Location, LorryRoute
-from .serializers import LorrySerializer, LocationSerializer, LorryRouteSerializer
+from prometheus_client import CONTENT_TYPE_LATEST
+from .eta import RoutingError, estimate_eta, fetch_tomtom_route
+from .ingest import get_write_behind_buffer
+from .metrics import render_metrics, scrape_allowed, time_upstream
+from .models import Lorry, Location, LorryRoute, LorryRollup
+from .serializers import LorrySerializer, LocationSerializer, LorryRouteSerializer, LorryRollupSerializer
 
 
 def is_overall_admin(user):
@@ -95,15 +103,128 @@ def ingest_location(request):
     if not (is_overall_admin(request.user) or is_lorry_owner(request.user, lorry)):
         return Response({'detail': 'Forbidden'}, status=403)
 
-    location = Location.objects.create(
+    location = Location(
         lorry=lorry,
         point=Point(lon, lat, srid=4326),
-        current_county=county or ''
+        current_county=county or '',
+        timestamp=timezone.now()
     )
 
+    if settings.INGEST_WRITE_BEHIND:
+        # Acknowledge now; the background flusher persists it within a flush interval
+        if not get_write_behind_buffer().enqueue(location):
+            return Response({'detail': 'Ingest queue full, retry later'}, status=503,
+                            headers={'Retry-After': '5'})
+        return Response({
+            'lorry': lorry.id,
+            'lorry_name': lorry.name,
+            'latitude': lat,
+            'longitude': lon,
+            'timestamp': location.timestamp,
+            'current_county': location.current_county,
+            'queued': True,
+        }, status=202)
+
+    location.save()
     return Response(LocationSerializer(location).data, status=201)
 
 
+MAX_FIX_BATCH = 500
+MAX_FIX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ingest_location_batch(request):
+    # Accepts a batch of queued fixes from the PWA; replayed ids are ignored
+    """
+    Bulk ingest for fixes recorded offline.
+
+    Body: {"fixes": [{"id": <uuid>, "lorry_id", "lat", "lon", "timestamp", "current_county"}]}.
+    Fixes may arrive late and out of order; each keeps its own timestamp and
+    the client id makes retries idempotent. Every fix is reported back as
+    accepted (stored or already stored) or rejected (will never be stored),
+    so the client can drop both from its queue.
+    """
+    fixes = request.data.get('fixes') if isinstance(request.data, dict) else None
+    if not isinstance(fixes, list):
+        return Response({'detail': 'fixes must be a list'}, status=400)
+    if len(fixes) > MAX_FIX_BATCH:
+        return Response({'detail': f'at most {MAX_FIX_BATCH} fixes per batch'}, status=400)
+
+    default_lorry_id = request.user.lorry.id if hasattr(request.user, 'lorry') else None
+    now = timezone.now()
+    allowed_lorries = {}
+    accepted, rejected, locations = [], [], []
+
+    def reject(fix_id, detail):
+        rejected.append({'id': fix_id, 'detail': detail})
+
+    for raw in fixes:
+        if not isinstance(raw, dict):
+            reject(None, 'fix must be an object')
+            continue
+        fix_id = raw.get('id')
+        try:
+            client_id = uuid.UUID(str(fix_id))
+        except ValueError:
+            reject(fix_id, 'id must be a UUID')
+            continue
+
+        try:
+            lorry_id = int(raw.get('lorry_id') or raw.get('lorry') or default_lorry_id)
+        except (TypeError, ValueError):
+            reject(fix_id, 'lorry_id is required')
+            continue
+
+        try:
+            lat = float(raw.get('lat', raw.get('latitude')))
+            lon = float(raw.get('lon', raw.get('longitude')))
+        except (TypeError, ValueError):
+            reject(fix_id, 'lat and lon must be numeric')
+            continue
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            reject(fix_id, 'lat/lon out of range')
+            continue
+
+        try:
+            timestamp = parse_datetime(str(raw.get('timestamp') or ''))
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            reject(fix_id, 'timestamp must be ISO 8601')
+            continue
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        if timestamp > now + MAX_FIX_CLOCK_SKEW:
+            reject(fix_id, 'timestamp is in the future')
+            continue
+
+        if lorry_id not in allowed_lorries:
+            lorry = Lorry.objects.filter(pk=lorry_id).first()
+            if lorry and not (is_overall_admin(request.user) or is_lorry_owner(request.user, lorry)):
+                lorry = None
+            allowed_lorries[lorry_id] = lorry
+        lorry = allowed_lorries[lorry_id]
+        if lorry is None:
+            reject(fix_id, 'Forbidden')
+            continue
+
+        county = raw.get('current_county') or raw.get('county')
+        locations.append(Location(
+            lorry=lorry,
+            point=Point(lon, lat, srid=4326),
+            timestamp=timestamp,
+            current_county=county or '',
+            client_id=client_id
+        ))
+        accepted.append(fix_id)
+
+    # One multi-row INSERT; fixes already stored under the same client id are skipped
+    Location.objects.bulk_create(locations, ignore_conflicts=True)
+    return Response({'accepted': accepted, 'rejected': rejected})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def latest_route_for_lorry(request, lorry_id):
@@ -156,26 +277,136 @@ def calculate_route(request):
     if not origin or not dest:
         return Response({'detail': 'origin and dest are required as \"lat,lon\"'}, status=400)
 
-    if not settings.TOMTOM_API_KEY:
-        return Response({'detail': 'TomTom API key not configured'}, status=500)
+    try:
+        return Response(fetch_tomtom_route(origin, dest))
+    except RoutingError as exc:
+        return Response(exc.payload, status=exc.status)
 
-    url = f"https://api.tomtom.com/routing/1/calculateRoute/{origin}:{dest}/json"
-    params = {
-        'key': settings.TOMTOM_API_KEY,
-        'routeRepresentation': 'polyline',
-        'computeTravelTimeFor': 'all',
-        'traffic': 'true'
-    }
 
-    try:
-        resp = requests.get(url, params=params, timeout=10)
-    except requests.RequestException as exc:
-        return Response({'detail': f'Failed to reach TomTom: {exc}'}, status=502)
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def lorry_eta(request, lorry_id):
+    # Projects the lorry's position onto its stored route to estimate ETA
+    """
+    Remaining distance/time along the latest stored route.
+
+    Position comes from lat/lon (query string for GET, body for POST; the
+    client's current fix), otherwise the lorry's newest stored location.
+    GET only projects and never changes anything. POST may also re-route
+    through TomTom and store the new route when the caller is the owner or
+    an admin; the new route is returned under "route" when that happens.
+    """
+    lorry = get_object_or_404(Lorry, pk=lorry_id)
+    route = LorryRoute.objects.filter(lorry=lorry).order_by('-created_at').first()
+    if not route:
+        return Response({}, status=204)
+
+    params = request.data if request.method == 'POST' else request.query_params
+    if not isinstance(params, dict):
+        return Response({'detail': 'body must be an object'}, status=400)
+    lat = params.get('lat')
+    lon = params.get('lon')
+    if lat is not None or lon is not None:
+        try:
+            lat = float(lat)
+            lon = float(lon)
+        except (TypeError, ValueError):
+            return Response({'detail': 'lat and lon must be numeric'}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return Response({'detail': 'lat/lon out of range'}, status=400)
+    else:
+        latest = Location.objects.filter(lorry=lorry).order_by('-timestamp').first()
+        if not latest:
+            return Response({'detail': 'No location for this lorry yet'}, status=404)
+        lat, lon = latest.point.y, latest.point.x
+
+    can_reroute = request.method == 'POST' and (is_overall_admin(request.user) or is_lorry_owner(request.user, lorry))
+    result = estimate_eta(lorry, route, lat, lon, allow_reroute=can_reroute)
+
+    if result['route'] is not None:
+        result['route'] = LorryRouteSerializer(result['route']).data
+    return Response(result)
 
-    if resp.status_code != 200:
-        return Response({'detail': 'TomTom error', 'status': resp.status_code, 'body': resp.text}, status=502)
 
-    return Response(resp.json())
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def fleet_report(request):
+    # Serves per-lorry/per-county totals from the rollup tables only
+    """
+    Time on road, fix counts and distance per lorry, read from LorryRollup.
+
+    Query params: period (day|hour, default day), since/until (YYYY-MM-DD,
+    default the last 7 days), lorry (id) and group_by (county|lorry).
+    Run `manage.py refresh_rollups` to bring the rollups up to date.
+    """
+    period = request.query_params.get('period', LorryRollup.PERIOD_DAY)
+    if period not in (LorryRollup.PERIOD_DAY, LorryRollup.PERIOD_HOUR):
+        return Response({'detail': 'period must be "day" or "hour"'}, status=400)
+
+    group_by = request.query_params.get('group_by', 'county')
+    if group_by not in ('county', 'lorry'):
+        return Response({'detail': 'group_by must be "county" or "lorry"'}, status=400)
+
+    today = timezone.now().date()
+    since_raw = request.query_params.get('since')
+    until_raw = request.query_params.get('until')
+    try:
+        since = parse_date(since_raw) if since_raw else today - timedelta(days=6)
+        until = parse_date(until_raw) if until_raw else today
+    except ValueError:
+        # Well-formed but impossible dates such as 2025-02-30
+        since = until = None
+    if since is None or until is None:
+        return Response({'detail': 'since/until must be YYYY-MM-DD'}, status=400)
+    if since > until:
+        return Response({'detail': 'since must not be after until'}, status=400)
+
+    rollups = LorryRollup.objects.filter(
+        period=period,
+        bucket_start__gte=timezone.make_aware(datetime.combine(since, time.min)),
+        bucket_start__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min)),
+    )
+    lorry_id = request.query_params.get('lorry')
+    if lorry_id:
+        if not lorry_id.isdigit():
+            return Response({'detail': 'lorry must be an id'}, status=400)
+        rollups = rollups.filter(lorry_id=int(lorry_id))
+
+    if group_by == 'county':
+        rollups = rollups.select_related('lorry').order_by('bucket_start', 'lorry_id', 'county')
+        return Response(LorryRollupSerializer(rollups, many=True).data)
+
+    # Collapse counties so each lorry has one row per bucket
+    totals = (rollups
+              .values('lorry', 'lorry__name', 'period', 'bucket_start')
+              .annotate(fix_count=Sum('fix_count'),
+                        distance_meters=Sum('distance_meters'),
+                        seconds_on_road=Sum('seconds_on_road'),
+                        first_fix_at=Min('first_fix_at'),
+                        last_fix_at=Max('last_fix_at'))
+              .order_by('bucket_start', 'lorry'))
+    return Response([
+        {
+            'lorry': row['lorry'],
+            'lorry_name': row['lorry__name'],
+            'period': row['period'],
+            'bucket_start': row['bucket_start'],
+            'fix_count': row['fix_count'],
+            'distance_meters': row['distance_meters'],
+            'seconds_on_road': row['seconds_on_road'],
+            'first_fix_at': row['first_fix_at'],
+            'last_fix_at': row['last_fix_at'],
+        }
+        for row in totals
+    ])
+
+
+def metrics(request):
+    # Exposes request/DB/upstream metrics in Prometheus text format
+    """Prometheus scrape endpoint (blocked at nginx; scrape web:8000 directly)."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
 
 
 def service_worker(request):
@@ -219,7 +450,8 @@ def pois_for_lorry(request, lorry_id):
     overpass_query = "\n".join(query_parts)
 
     try:
-        resp = requests.post(settings.OVERPASS_URL, data={'data': overpass_query}, timeout=30)
+        with time_upstream('overpass'):
+            resp = requests.post(settings.OVERPASS_URL, data={'data': overpass_query}, timeout=30)
     except requests.RequestException as exc:
         return Response({'detail': f'Failed to reach Overpass: {exc}'}, status=502)
 